@@ -1,6 +1,7 @@
 from time import time
 
 import cv2
+import numpy as np
 
 import utils
 from config import config
@@ -71,10 +72,15 @@ class Button:
             self.clicked = not self.clicked if state is None else state
             self.last_click_timestamp = c_time
 
-    def include(self, joint, normalized=True):
-        x_valid = self.tl_point[0] <= (joint.x * self.w_size[1] if normalized else joint.x) <= self.br_point[0]
-        y_valid = self.tl_point[1] <= (joint.y * self.w_size[0] if normalized else joint.y) <= self.br_point[1]
-        return x_valid and y_valid
+    def include(self, points, normalized=True):
+        """Mask of the (..., 2) points inside the button"""
+        if normalized:
+            points = points * (self.w_size[1], self.w_size[0])
+        x, y = points[..., 0], points[..., 1]
+        with np.errstate(invalid='ignore'):
+            x_valid = (self.tl_point[0] <= x) & (x <= self.br_point[0])
+            y_valid = (self.tl_point[1] <= y) & (y <= self.br_point[1])
+        return x_valid & y_valid
 
     def draw(self, image):
         if self.clicked:
@@ -120,6 +126,7 @@ class GUI:
         self.player_count = None
         self.game_mode = None
         self.body_part_indexes = config.app.model.BODY_PART_INDEXES
+        self.limb_indexes = [index for indexes in self.body_part_indexes.values() for index in indexes]
         self.w_size = w_size
 
         self.countdown = 5
@@ -239,18 +246,14 @@ class GUI:
                 self.buttons[connection[not connection.index(clicked_name)]].clicked = False
 
     def update_buttons(self, joints):
+        limbs = joints.xy[:, self.limb_indexes]
         for name, button in self.buttons.items():
-            indexes_inside = []
-            for item in joints:
-                for body_part in self.body_part_indexes:
-                    for index in self.body_part_indexes[body_part]:
-                        if button.include(item[index]):
-                            indexes_inside.append(index)
+            inside = bool(button.include(limbs).any())
             if type(button) is StartButton:
                 if self.player_count is None or self.game_mode is None:
                     continue
-                button.click(state=indexes_inside)
-            elif indexes_inside:
+                button.click(state=inside)
+            elif inside:
                 button.click()
                 self.toggle_buttons(name)
 
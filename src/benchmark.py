@@ -0,0 +1,971 @@
+"""
+Micro-benchmarks of the application hot paths.
+
+Run from the project root, e.g. `python src/benchmark.py capture --frames 600`
+"""
+import argparse
+import collections
+import time
+import tracemalloc
+from threading import Thread
+
+import cv2
+import numpy as np
+
+from frame_ring import FrameRing
+
+
+class SyntheticCapture:
+    """Stand-in for cv2.VideoCapture that follows its allocation behaviour in read()"""
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.source = np.random.default_rng(0).integers(0, 256, self.shape, dtype=np.uint8)
+
+    def read(self, image=None):
+        if image is None or image.shape != self.shape:
+            image = np.empty(self.shape, np.uint8)
+        np.copyto(image, self.source)
+        return True, image
+
+
+def _measure(step, num_frames):
+    """Run step() num_frames times, return elapsed seconds and bytes allocated per frame"""
+    tracemalloc.start()
+    allocated = 0
+    start = time.perf_counter()
+    for _ in range(num_frames):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - current
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return elapsed, allocated / num_frames
+
+
+def bench_capture(args):
+    shape = (args.height, args.width, 3)
+    if args.camera is None:
+        capture = SyntheticCapture(shape)
+    else:
+        capture = cv2.VideoCapture(args.camera)
+        _, first = capture.read()
+        shape = first.shape
+
+    frame_deque = collections.deque(maxlen=args.ring_size)
+
+    def deque_step():
+        _, frame = capture.read()
+        frame_deque.append(frame)
+
+    frames = FrameRing(shape, args.ring_size)
+
+    def ring_step():
+        slot = frames.acquire_write()
+        _, frame = capture.read(image=slot.buffer)
+        if frame is not slot.buffer:
+            np.copyto(slot.buffer, frame)
+        frames.publish(slot, time.perf_counter())
+
+    print(f'Capture of {args.frames} frames {shape[1]}x{shape[0]}:')
+    for name, step in (('deque', deque_step), ('ring', ring_step)):
+        elapsed, allocated = _measure(step, args.frames)
+        print(f'  {name:>6}: {args.frames / elapsed:8.1f} FPS, {allocated / 1024:10.1f} KiB allocated per frame')
+
+
+def bench_preprocess(args):
+    from pose_utils.models.utils import PaddedResize, resize_image
+
+    rng = np.random.default_rng(0)
+    for frame_h, frame_w in ((720, 1280), (1080, 1920)):
+        frame = rng.integers(0, 256, (frame_h, frame_w, 3), dtype=np.uint8)
+        # Network input size chosen the way OpenvinoInferenceThread does it
+        target_size = frame_h * args.net_width // frame_w
+        net_h = (target_size + 31) // 32 * 32
+        net_w = (args.net_width + 31) // 32 * 32
+        float_tensor = np.zeros((1, 3, net_h, net_w), np.float32)
+        u8_tensor = np.zeros((1, 3, net_h, net_w), np.uint8)
+        resize = PaddedResize((net_w, net_h))
+
+        def old_step():
+            resized_frame = cv2.resize(frame, (net_w, net_h), interpolation=cv2.INTER_AREA)
+            img = resize_image(resized_frame, (net_w, net_h), keep_aspect_ratio=True)
+            h, w = img.shape[:2]
+            img = np.pad(img, ((0, net_h - h), (0, net_w - w), (0, 0)), mode='constant', constant_values=0)
+            img = img.transpose((2, 0, 1))[None]
+            # Copy into the FP32 input blob made by InferRequest.async_infer(inputs)
+            float_tensor[...] = img
+
+        def fused_step():
+            resize(frame, u8_tensor)
+
+        print(f'Preprocessing {frame_w}x{frame_h} into {net_w}x{net_h}:')
+        for name, step in (('old', old_step), ('fused', fused_step)):
+            elapsed, allocated = _measure(step, args.frames)
+            print(f'  {name:>6}: {elapsed / args.frames * 1000:7.3f} ms per frame, '
+                  f'{allocated / 1024:8.1f} KiB allocated per frame')
+
+
+def synthetic_decoder_inputs(rng, num_people, num_joints=17, height=64, width=96):
+    """Heatmaps, nms heatmaps and embeddings with num_people well separated people"""
+    heatmaps = np.abs(rng.normal(0, 0.02, (1, num_joints, height, width))).astype(np.float32)
+    tags = rng.normal(0, 0.3, (1, num_joints, height, width, 1)).astype(np.float32)
+    for person in range(num_people):
+        center_x, center_y = rng.uniform(10, width - 10), rng.uniform(10, height - 10)
+        for joint in range(num_joints):
+            x = int(np.clip(center_x + rng.normal(0, 4), 0, width - 1))
+            y = int(np.clip(center_y + rng.normal(0, 6), 0, height - 1))
+            heatmaps[0, joint, y, x] = rng.uniform(0.3, 1)
+            tags[0, joint, y, x, 0] = person * 3 + rng.normal(0, 0.2)
+    return heatmaps, heatmaps.copy(), tags
+
+
+def _loop_adjust(ans, heatmaps):
+    """AssociativeEmbeddingDecoder.adjust as it looped over joints before it was vectorized"""
+    H, W = heatmaps.shape[-2:]
+    for batch_idx, people in enumerate(ans):
+        for person in people:
+            for k, joint in enumerate(person):
+                heatmap = heatmaps[batch_idx, k]
+                px = int(joint[0])
+                py = int(joint[1])
+                if 1 < px < W - 1 and 1 < py < H - 1:
+                    diff = np.array([
+                        heatmap[py, px + 1] - heatmap[py, px - 1],
+                        heatmap[py + 1, px] - heatmap[py - 1, px]
+                    ])
+                    joint[:2] += np.sign(diff) * .25
+    return ans
+
+
+def _loop_refine(heatmap, tag, keypoints, pose_tag=None):
+    """AssociativeEmbeddingDecoder.refine of a single pose as it was before it was vectorized"""
+    K, H, W = heatmap.shape
+    if len(tag.shape) == 3:
+        tag = tag[..., None]
+
+    if pose_tag is not None:
+        prev_tag = pose_tag
+    else:
+        tags = []
+        for i in range(K):
+            if keypoints[i, 2] > 0:
+                x, y = keypoints[i][:2].astype(int)
+                tags.append(tag[i, y, x])
+        prev_tag = np.mean(tags, axis=0)
+
+    for i, (_heatmap, _tag) in enumerate(zip(heatmap, tag)):
+        if keypoints[i, 2] > 0:
+            continue
+        diff = np.abs(_tag[..., 0] - prev_tag) + 0.5
+        diff = diff.astype(np.int32).astype(_heatmap.dtype)
+        diff -= _heatmap
+        idx = diff.argmin()
+        y, x = np.divmod(idx, _heatmap.shape[-1])
+        val = _heatmap[y, x]
+        if val > 0:
+            keypoints[i, :3] = x, y, val
+            if 1 < x < W - 1 and 1 < y < H - 1:
+                diff = np.array([
+                    _heatmap[y, x + 1] - _heatmap[y, x - 1],
+                    _heatmap[y + 1, x] - _heatmap[y - 1, x]
+                ])
+                keypoints[i, :2] += np.sign(diff) * .25
+    return keypoints
+
+
+def _loop_local_maximum(heatmap, joints_idx, joints, window):
+    """Flat index of the heatmap maximum in a window around every joint, a joint at a time"""
+    H, W = heatmap.shape[-2:]
+    idx = []
+    for k, (x, y) in zip(joints_idx, joints[:, :2].astype(int)):
+        best = None
+        for patch_y in range(max(y - window, 0), min(y + window, H - 1) + 1):
+            for patch_x in range(max(x - window, 0), min(x + window, W - 1) + 1):
+                if best is None or heatmap[k, patch_y, patch_x] > heatmap[k, best[0], best[1]]:
+                    best = patch_y, patch_x
+        idx.append(best[0] * W + best[1])
+    return np.array(idx)
+
+
+def check_decoder(decoder, inputs, rng):
+    """
+    Compare adjust, refine and _local_maximum of the decoder with their loop based versions.
+
+    decode used to pass refine the tag of the pose at its index before the score threshold,
+    which is the one intended difference. Both versions are given the tag of the pose here.
+    """
+    for heatmaps, nms_heatmaps, embeddings in inputs:
+        heatmaps = np.abs(heatmaps)
+        tag_k, loc_k, val_k = decoder.top_k(nms_heatmaps, embeddings)
+        poses, pose_tags, _ = decoder._match_by_tag((tag_k[0], loc_k[0], val_k[0]))
+        K, H, W = heatmaps.shape[1:]
+        # Joints anywhere up to the heatmap border as well
+        scattered = poses.copy()
+        scattered[..., 0] = rng.integers(0, W, scattered.shape[:2]) + rng.uniform(0, 1, scattered.shape[:2])
+        scattered[..., 1] = rng.integers(0, H, scattered.shape[:2]) + rng.uniform(0, 1, scattered.shape[:2])
+
+        for ans in (poses, scattered):
+            if not np.array_equal(decoder.adjust([ans.copy()], heatmaps)[0], _loop_adjust([ans.copy()], heatmaps)[0]):
+                raise AssertionError('Vectorized adjust differs from the loop based one')
+
+        # Some joints are missing for refine to look for
+        missing = poses.copy()
+        missing[rng.uniform(size=missing.shape[:2]) < 0.3, 2] = 0
+        new = decoder.refine(heatmaps[0], embeddings[0], missing.copy(), pose_tags)
+        old = np.stack([_loop_refine(heatmaps[0], embeddings[0], pose.copy(), tag)
+                        for pose, tag in zip(missing, pose_tags)])
+        if not np.array_equal(new, old):
+            raise AssertionError('Vectorized refine differs from the loop based one')
+
+        joints_idx = rng.integers(0, K, 64)
+        joints = np.stack([rng.uniform(0, W, 64), rng.uniform(0, H, 64)], axis=1)
+        for window in (1, 2, 3):
+            if not np.array_equal(decoder._local_maximum(heatmaps[0], joints_idx, joints, window),
+                                  _loop_local_maximum(heatmaps[0], joints_idx, joints, window)):
+                raise AssertionError('Vectorized local maximum differs from the loop based one')
+
+
+def bench_decoder(args):
+    from pose_utils.models.hpe_associative_embedding import AssociativeEmbeddingDecoder
+
+    decoder = AssociativeEmbeddingDecoder(
+        num_joints=17, adjust=True, refine=True, max_num_people=30, detection_threshold=0.1, tag_threshold=1,
+        pose_threshold=0.1, use_detection_val=True, ignore_too_much=False, dist_reweight=True)
+    rng = np.random.default_rng(0)
+
+    if args.record:
+        # Outputs of the network saved with np.savez(path, heatmaps=..., nms_heatmaps=..., embeddings=...)
+        record = np.load(args.record)
+        inputs = [(record['heatmaps'], record['nms_heatmaps'], record['embeddings'])]
+        print(f'Decoding {args.record}:')
+    else:
+        inputs = [synthetic_decoder_inputs(rng, args.people) for _ in range(16)]
+        print(f'Decoding synthetic heatmaps with {args.people} people:')
+    check_decoder(decoder, inputs, rng)
+
+    start = time.perf_counter()
+    for i in range(args.frames):
+        heatmaps, nms_heatmaps, embeddings = inputs[i % len(inputs)]
+        decoder(heatmaps.copy(), embeddings, nms_heatmaps=nms_heatmaps)
+    elapsed = time.perf_counter() - start
+    print(f'  {elapsed / args.frames * 1000:7.3f} ms per frame')
+
+
+def bench_joints(args):
+    from models.intel_pose import IntelPoseModel
+    from utils import FrameInfo
+
+    Joint = collections.namedtuple('Joint', 'x y score')
+    rng = np.random.default_rng(0)
+    shape = (720, 1280, 3)
+    poses = np.concatenate([rng.uniform(0, 1, (args.people, 17, 2)) * (shape[1], shape[0]),
+                            rng.uniform(0, 1, (args.people, 17, 2))], axis=2)
+    track_ids = np.arange(args.people)
+    result = ((poses, None, track_ids), {'frame': FrameInfo(0, 0.0, shape)})
+
+    def old_step():
+        # Joints built one at a time, flipped and split into the halves of the frame as before
+        people = []
+        for pose in poses[IntelPoseModel.get_players_order(track_ids)]:
+            people.append([Joint(x / shape[1], y / shape[0], score) for x, y, score, _ in pose])
+        people = [[Joint(1 - joint.x, joint.y, joint.score) for joint in person] for person in people]
+        for person in people:
+            left = sum(joint.x <= 0.5 for joint in person) > sum(joint.x > 0.5 for joint in person)
+            for index, joint in enumerate(person):
+                if left:
+                    person[index] = None if joint.x >= 0.5 else Joint(joint.x * 2, joint.y, joint.score)
+                else:
+                    person[index] = None if joint.x <= 0.5 else Joint((joint.x - 0.5) * 2, joint.y, joint.score)
+
+    def array_step():
+        IntelPoseModel.get_joints_from_result(result).flip().split()
+
+    print(f'Joints of {min(args.people, 2)} players from the model output, flipped and split:')
+    for name, step in (('old', old_step), ('arrays', array_step)):
+        elapsed, allocated = _measure(step, args.frames)
+        print(f'  {name:>6}: {elapsed / args.frames * 1000:7.3f} ms per frame, '
+              f'{allocated / 1024:8.1f} KiB allocated per frame')
+
+
+def _hits(circles, people, w_size):
+    """Hit test outcome of every circle against the person it was placed for"""
+    from config import config
+    from object_manager import targets_hit
+
+    model = config.app.model
+    return [
+        person_index < len(people) and bool(targets_hit([center], people[person_index:person_index + 1],
+                                                        model.BODY_PART_INDEXES, config.gameplay.circle_radius,
+                                                        w_size, [mask])[0])
+        for person_index, _, (center, mask) in circles
+    ]
+
+
+def bench_hits(args):
+    from config import config
+    from hit_testing import target_mask
+    from object_manager import targets_hit
+    from session import synthetic_session
+    from utils import Poses
+
+    rng = np.random.default_rng(0)
+    shape = (720, 1280, 3)
+    radius = config.gameplay.circle_radius
+    body_part_indexes = config.app.model.BODY_PART_INDEXES
+    poses = [result.joints.data[0] for result in synthetic_session(duration=2, num_people=1, seed=0)]
+
+    def old_hit(center, side, need_part, landmarks):
+        # Scalar test of every body part and joint of every person, as circle_includes did it
+        for person in landmarks:
+            for body_part in body_part_indexes:
+                for index in body_part_indexes[body_part]:
+                    x, y, _ = person[index]
+                    if (x * shape[1] - center[0]) ** 2 + (y * shape[0] - center[1]) ** 2 <= radius ** 2:
+                        if body_part.split("_") == [side, need_part]:
+                            return True
+        return False
+
+    print(f'Hit tests of {len(poses)} frames:')
+    print(f'  {"targets":>7} {"players":>7} {"scalar":>9} {"vectorized":>10} {"hits":>6}')
+    for num_targets in args.targets:
+        circles = []
+        for _ in range(num_targets):
+            side, part = rng.choice(['L', 'R']), rng.choice(['hand', 'foot'])
+            center = (int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0])))
+            circles.append((center, side, part))
+        centers = [center for center, _, _ in circles]
+        masks = [target_mask(side, part) for _, side, part in circles]
+        for num_players in args.players:
+            frames = [Poses(np.stack([pose + (offset, 0, 0) for offset in np.linspace(-0.3, 0.3, num_players)]))
+                      for pose in poses]
+            lists = [frame.data.tolist() for frame in frames]
+
+            start = time.perf_counter()
+            old = [[old_hit(*circle, landmarks) for circle in circles] for landmarks in lists]
+            old_elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            new = [targets_hit(centers, frame, body_part_indexes, radius, shape, masks) for frame in frames]
+            new_elapsed = time.perf_counter() - start
+
+            if not np.array_equal(np.array(old), np.array(new)):
+                raise AssertionError('Vectorized hits differ from the scalar ones')
+            print(f'  {num_targets:7d} {num_players:7d} {old_elapsed / len(frames) * 1000:6.3f} ms '
+                  f'{new_elapsed / len(frames) * 1000:7.3f} ms {np.sum(new):6d}')
+
+
+def bench_entities(args):
+    import random
+
+    from config import config
+    from drawing import draw_objects
+    from object_manager import DefaultCircleManager, MoovingCircleManager, PackmanManager
+    from objects import EntityStore
+    from session import synthetic_session
+
+    random.seed(0)
+    results = synthetic_session(duration=4, num_people=2, seed=0)
+    frame = np.zeros(results[0].frame.shape, np.uint8)
+    w_size = frame.shape[:2]
+    radius = config.gameplay.circle_radius
+    body_part_indexes = config.app.model.BODY_PART_INDEXES
+    budget = 1 / config.input_rate.default_fps
+
+    print(f'Stress of {len(results)} frames of two players, objects topped up every frame, '
+          f'budget {budget * 1000:.1f} ms:')
+    print(f'  {"objects":>7} {"update":>9} {"draw":>9} {"budget":>6} {"popped":>6}')
+    for num_targets in args.targets:
+        entities = EntityStore()
+        managers = (DefaultCircleManager(w_size, entities), PackmanManager(w_size, entities),
+                    MoovingCircleManager(w_size, entities))
+        # Mix of the intensive mode, 80% circles, 10% packmans and 10% mooving circles
+        shares = (0.8, 0.1, 0.1)
+        update = draw = 0.0
+        popped = 0
+        for result in results:
+            for manager, share in zip(managers, shares):
+                for _ in range(round(num_targets * share) - len(manager.rows())):
+                    if isinstance(manager, DefaultCircleManager):
+                        manager.add(radius, hands_only=False)
+                    else:
+                        manager.add(radius)
+
+            start = time.perf_counter()
+            for manager in managers:
+                popped += manager.pop_out(result.joints, body_part_indexes, radius)
+            update += time.perf_counter() - start
+            start = time.perf_counter()
+            draw_objects(frame, entities, radius)
+            draw += time.perf_counter() - start
+
+        update, draw = update / len(results), draw / len(results)
+        print(f'  {num_targets:7d} {update * 1000:6.3f} ms {draw * 1000:6.3f} ms {(update + draw) / budget:6.1%} '
+              f'{popped:6d}')
+
+
+def bench_timestep(args):
+    import random
+
+    from gameplay import Game
+
+    class Glide(Game):
+        """A mooving circle gliding along its ellipse and nothing else"""
+
+        def tick(self, landmarks):
+            self.MCM.pop_out(landmarks, self.body_part_indexes, self.circle_radius)
+            return True
+
+    w_size = (720, 1280)
+    frame = np.zeros(w_size + (3,), np.uint8)
+    print(f'Mooving circle drawn over {args.duration:g} s of frames with {args.jitter:.0%} interval jitter, '
+          f'stepped once per frame against fixed steps:')
+    print(f'  {"fps":>4} {"mode":>9} {"speed":>10} {"game time":>9}')
+    for fps in args.fps:
+        for mode in ('per frame', 'fixed'):
+            random.seed(0)
+            rng = np.random.default_rng(0)
+            now = 0.0
+            game = Glide(w_size, clock=lambda: now)
+            # An ellipse long enough not to end before the last frame
+            game.MCM.trajectories = ('ellipse',)
+            game.add_new_ellipse_curve()
+            entities = game.entities
+            # Started
+            entities.progress[:] = 1
+            shown = [entities.center[0].copy()]
+            while now < args.duration:
+                now += rng.uniform(1 - args.jitter, 1 + args.jitter) / fps
+                if mode == 'fixed':
+                    game.process(frame)
+                    alpha = game.timestep.alpha
+                else:
+                    entities.previous_center[:] = entities.center
+                    game.tick(None)
+                    game.time += game.timestep.dt
+                    alpha = 1.0
+                shown.append(entities.previous_center[0] + (entities.center[0] - entities.previous_center[0]) * alpha)
+            distance = np.sum(np.linalg.norm(np.diff(shown, axis=0), axis=1))
+            print(f'  {fps:4d} {mode:>9} {distance / now:6.1f} px/s {game.time:7.2f} s')
+
+
+def bench_cadence(args):
+    from config import config
+    from hit_testing import target_mask
+    from interpolation import joints_at
+    from session import load_session, synthetic_session
+
+    if args.session:
+        # Recorded with the default cadence of one, so that every frame has ground truth joints
+        truth = load_session(args.session)
+        print(f'Session {args.session}, {len(truth)} frames:')
+    else:
+        truth = synthetic_session(seed=0)
+        print(f'Synthetic session, {len(truth)} frames:')
+    w_size = truth[0].frame.shape[:2]
+    rng = np.random.default_rng(0)
+
+    # Circles next to the hands and feet of the true poses, about half of them are hit
+    radius = config.gameplay.circle_radius
+    body_part_indexes = config.app.model.BODY_PART_INDEXES
+    circles = []
+    for result in truth:
+        frame_circles = []
+        for person_index, person in enumerate(result.joints.data):
+            for body_part in ('L_hand', 'R_hand', 'L_foot', 'R_foot'):
+                x, y, _ = person[body_part_indexes[body_part][0]]
+                if np.isnan(x):
+                    continue
+                offset = rng.uniform(-1.5 * radius, 1.5 * radius, 2)
+                center = (x * w_size[1] + offset[0], y * w_size[0] + offset[1])
+                circle = (center, target_mask(*body_part.split('_')))
+                frame_circles.append((person_index, body_part, circle))
+        circles.append(frame_circles)
+    true_hits = [_hits(frame_circles, result.joints, w_size) for frame_circles, result in zip(circles, truth)]
+    num_hits = sum(map(sum, true_hits))
+
+    print(f'  {"interval":>8} {"mode":>11} {"inference":>9} {"hits found":>10} {"false hits":>10} '
+          f'{"limb error":>10} {"joints time":>11}')
+    for interval in range(1, args.max_interval + 1):
+        keyframes = truth[::interval]
+        for mode in ('latest', 'interpolate'):
+            found = false = 0
+            errors = []
+            elapsed = 0.0
+            available = 0
+            for frame_circles, frame_hits, result in zip(circles, true_hits, truth):
+                timestamp = result.frame.timestamp
+                # Results arrive after the inference latency
+                while available < len(keyframes) and \
+                        keyframes[available].frame.timestamp + args.latency <= timestamp:
+                    available += 1
+                if available == 0:
+                    continue
+                start = time.perf_counter()
+                if mode == 'latest':
+                    people = keyframes[available - 1].joints
+                else:
+                    people = joints_at(keyframes[max(available - 2, 0):available], timestamp, args.max_extrapolation)
+                elapsed += time.perf_counter() - start
+
+                hits = _hits(frame_circles, people, w_size)
+                found += sum(hit and true_hit for hit, true_hit in zip(hits, frame_hits))
+                false += sum(hit and not true_hit for hit, true_hit in zip(hits, frame_hits))
+                for person_index, body_part, _ in frame_circles:
+                    joint_index = body_part_indexes[body_part][0]
+                    true_joint = result.joints.xy[person_index, joint_index]
+                    if person_index < len(people) and people.valid[person_index, joint_index]:
+                        error = (people.xy[person_index, joint_index] - true_joint) * (w_size[1], w_size[0])
+                        errors.append(np.hypot(*error))
+
+            print(f'  {interval:8d} {mode:>11} {1 / interval:9.0%} {found / num_hits:10.1%} {false / num_hits:10.1%} '
+                  f'{np.mean(errors):7.1f} px {elapsed / len(truth) * 1000:8.3f} ms')
+    print('  Inference share is the part of inference runs left, and so of their CPU time')
+
+
+def bench_smoothing(args):
+    from config import Smoothing
+    from session import load_session, synthetic_session
+    from smoothing import create_filter
+    from utils import PoseResult, Poses
+
+    rng = np.random.default_rng(0)
+    if args.session:
+        # Raw recorded joints have no ground truth, only their jitter is compared
+        truth = None
+        noisy = load_session(args.session)
+        print(f'Session {args.session}, {len(noisy)} frames:')
+    else:
+        # Lower network input widths are modelled by stronger joint noise
+        truth = synthetic_session(seed=0)
+        noisy = []
+        for result in truth:
+            joints = result.joints.data.astype(np.float64)
+            joints[..., :2] += rng.normal(0, args.noise, joints[..., :2].shape)
+            noisy.append(PoseResult(result.frame, Poses(joints), result.track_ids))
+        print(f'Synthetic session, {len(noisy)} frames, joint noise of {args.noise:.3f} frame sizes:')
+    width, height = noisy[0].frame.shape[1], noisy[0].frame.shape[0]
+    arrays = [result.joints.data for result in noisy]
+    scale = np.array((width, height))
+
+    print(f'  {"method":>9} {"error":>9} {"jitter":>9} {"time":>9}')
+    for method in ('', 'one_euro', 'kalman'):
+        joint_filter = create_filter(Smoothing(method=method))
+        smoothed = []
+        start = time.perf_counter()
+        for result, joints in zip(noisy, arrays):
+            if joint_filter is not None:
+                joints = joint_filter(joints, result.track_ids, result.frame.timestamp)
+            smoothed.append(joints[..., :2] * scale)
+        elapsed = time.perf_counter() - start
+
+        positions = np.stack(smoothed)
+        # Frame to frame change of joint velocity is what shows up as flicker
+        jitter = np.sqrt(np.nanmean(np.diff(positions, n=2, axis=0) ** 2))
+        error = '-'
+        if truth is not None:
+            true_positions = np.stack([result.joints.xy * scale for result in truth])
+            error = f'{np.sqrt(np.nanmean((positions - true_positions) ** 2)):6.2f} px'
+        print(f'  {method or "raw":>9} {error:>9} {jitter:6.2f} px {elapsed / len(noisy) * 1000:6.3f} ms')
+
+
+def bench_startup(args):
+    import math
+    import shutil
+    import tempfile
+
+    from openvino.inference_engine import IECore
+
+    from config import config
+    from pose_utils import models
+    from pose_utils.pipelines import AsyncPipeline, NetworkCache, get_user_config
+
+    cache_dir = tempfile.mkdtemp(prefix='network_cache_')
+    target_size = math.floor(args.height * args.net_width / args.width)
+    plugin_config = get_user_config(config.app.inference_device, config.inference.streams, config.inference.threads)
+    print(f'Startup with {config.app.model_path.name} at input width {args.net_width}:')
+    try:
+        for name, cached in (('no cache', False), ('cold cache', True), ('warm cache', True)):
+            # A new Inference Engine every time, so that nothing stays loaded in the plugin
+            start = time.perf_counter()
+            ie = IECore()
+            model = models.HpeAssociativeEmbedding(
+                ie, config.app.model_path, aspect_ratio=args.width / args.height,
+                target_size=target_size, prob_threshold=0.1,
+            )
+            read_end = time.perf_counter()
+            network_cache = NetworkCache(ie, cache_dir) if cached else None
+            AsyncPipeline(ie, model, plugin_config, device=config.app.inference_device,
+                          max_num_requests=config.inference.max_requests, network_cache=network_cache)
+            end = time.perf_counter()
+            counts = f', {network_cache.hits} hits, {network_cache.misses} misses' if cached else ''
+            print(f'  {name:>10}: read and reshape {read_end - start:6.2f} s, load {end - read_end:6.2f} s, '
+                  f'total {end - start:6.2f} s{counts}')
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+# Modules guarded by the imports benchmark with the heavy modules they must not pull in
+IMPORT_GUARDS = {
+    'config': ('cv2', 'scipy', 'openvino', 'models.intel_pose'),
+    'pose_utils.models': ('cv2', 'scipy', 'ngraph', 'openvino'),
+    'pose_utils.models.hpe_associative_embedding': ('ngraph',),
+    'session': ('cv2', 'scipy'),
+    'smoothing': ('cv2', 'scipy'),
+}
+
+
+def parse_importtime(output):
+    """Self and cumulative microseconds of every module in the output of python -X importtime"""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def bench_imports(args):
+    import os
+    import subprocess
+    import sys
+
+    src = os.path.dirname(os.path.abspath(__file__))
+    failed = False
+    print(f'Import time of a fresh interpreter, best of {args.repeat}:')
+    for module, forbidden in IMPORT_GUARDS.items():
+        best = None
+        for _ in range(args.repeat):
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                cwd=src, capture_output=True, text=True,
+            )
+            if process.returncode != 0:
+                print(f'  {module}: import failed\n{process.stderr.splitlines()[-1]}')
+                failed = True
+                break
+            times = parse_importtime(process.stderr)
+            if best is None or times[module][1] < best[module][1]:
+                best = times
+        if best is None or module not in best:
+            continue
+
+        total_ms = best[module][1] / 1000
+        pulled = [name for name in forbidden if name in best]
+        heaviest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        over_budget = args.budget is not None and total_ms > args.budget
+        status = 'FAIL' if pulled or over_budget else 'ok'
+        print(f'  {module:>45}: {total_ms:7.1f} ms {status}')
+        if pulled:
+            print(f'    imports {", ".join(pulled)}')
+        print('    heaviest: ' + ', '.join(f'{name} {times[0] / 1000:.1f} ms' for name, times in heaviest))
+        failed = failed or status == 'FAIL'
+    if failed:
+        sys.exit(1)
+
+
+def bench_roi(args):
+    from config import config
+    from roi import PersonRoi
+    from session import synthetic_session
+    from utils import PoseResult, Poses
+
+    # A single dancer standing further from the camera, so that they take scale of the frame height
+    results = []
+    for result in synthetic_session(num_people=1, seed=0):
+        joints = result.joints.data.copy()
+        joints[..., :2] = (joints[..., :2] - 0.5) * args.scale + 0.5
+        results.append(PoseResult(result.frame, Poses(joints), result.track_ids))
+    height, width = results[0].frame.shape[:2]
+
+    roi = PersonRoi(results[0].frame.shape, config.roi.padding, config.roi.min_size, config.roi.max_size,
+                    config.roi.max_people, config.app.detection_threshold, config.roi.full_frame_interval)
+    zooms = []
+    inside = total = 0
+    start = time.perf_counter()
+    for index, result in enumerate(results):
+        # Regions come from the result available when the frame is submitted
+        previous = results[index - args.lag].joints if index >= args.lag else Poses.empty()
+        region = roi.select(previous)
+        if region is None:
+            continue
+        x0, y0, x1, y1 = region
+        zooms.append(width / (x1 - x0))
+        points = result.joints.xy[0] * (width, height)
+        inside += np.sum((points[:, 0] >= x0) & (points[:, 0] < x1) & (points[:, 1] >= y0) & (points[:, 1] < y1))
+        total += len(points)
+    elapsed = time.perf_counter() - start
+
+    print(f'Synthetic single player session, {len(results)} frames, player at {args.scale:.0%} of full size, '
+          f'regions {args.lag} frames behind:')
+    print(f'  region inferred on {roi.cropped_share:.1%} of frames at {np.mean(zooms) if zooms else 1:.2f}x '
+          f'the full frame resolution')
+    print(f'  {inside / max(total, 1):.2%} of joints inside their region, '
+          f'selection time {elapsed / len(results) * 1000:.3f} ms per frame')
+
+
+def synthetic_motion_frames(rng, shape, num_frames, moving_share=0.3, sensor_noise=2.0):
+    """
+    Frames of a static scene with a person-sized block moving across it in every other segment.
+    Yields frames along with whether the block moves in them.
+    """
+    height, width = shape[:2]
+    background = cv2.GaussianBlur(rng.integers(0, 256, shape, dtype=np.uint8), (0, 0), 8)
+    block = (height // 2, width // 8)
+    segment = 90
+    x = width // 4
+    for index in range(num_frames):
+        moving = (index // segment) % 2 == 1 and (index % segment) < segment * 2 * moving_share
+        if moving:
+            x = (x + width // 100) % (width - block[1])
+        frame = background.copy()
+        frame[height // 4:height // 4 + block[0], x:x + block[1]] = 200
+        frame = cv2.add(frame, rng.normal(0, sensor_noise, shape).astype(np.int8), dtype=cv2.CV_8U)
+        yield frame, moving
+
+
+def bench_motion(args):
+    from config import config
+    from pacing import MotionGate
+
+    rng = np.random.default_rng(0)
+    shape = (args.height, args.width, 3)
+    gate = MotionGate(config.motion_gate.still_threshold, config.motion_gate.motion_threshold,
+                      config.motion_gate.max_skips, config.motion_gate.width)
+    moving_frames = missed = 0
+    elapsed = 0.0
+    for frame, moving in synthetic_motion_frames(rng, shape, args.frames):
+        start = time.perf_counter()
+        infer = gate.should_infer(frame)
+        elapsed += time.perf_counter() - start
+        moving_frames += moving
+        missed += moving and not infer
+
+    print(f'Synthetic scene, {args.frames} frames of {args.width}x{args.height}, '
+          f'{moving_frames / args.frames:.0%} of them with motion:')
+    print(f'  inference skipped on {gate.skipped_share:.1%} of frames, '
+          f'{missed / max(moving_frames, 1):.1%} of frames with motion skipped')
+    print(f'  gate time {elapsed / args.frames * 1000:.3f} ms per frame')
+
+
+class SyntheticInferenceThread(Thread):
+    """
+    Inference thread on synthetic network outputs: sleeps for the device latency, then decodes
+    on the CPU, holding the GIL as postprocessing of the real network does
+    """
+
+    def __init__(self, frames, joints_deque, capture_shape, result_event=None, input_rate=None, recorder=None,
+                 latency=0.02, people=4):
+        super().__init__()
+        self._keep_running = False
+        self.frames = frames
+        self.joints_deque = joints_deque
+        self.result_event = result_event
+        self.latency = latency
+        self.people = people
+        self.last_seq = -1
+
+    def run(self):
+        from pose_utils.models.hpe_associative_embedding import AssociativeEmbeddingDecoder
+        from utils import PoseResult, Poses
+
+        decoder = AssociativeEmbeddingDecoder(
+            num_joints=17, adjust=True, refine=True, max_num_people=30, detection_threshold=0.1, tag_threshold=1,
+            pose_threshold=0.1, use_detection_val=True, ignore_too_much=False, dist_reweight=True)
+        rng = np.random.default_rng(0)
+        inputs = [synthetic_decoder_inputs(rng, self.people) for _ in range(8)]
+        self._keep_running = True
+        while self._keep_running:
+            slot = self.frames.acquire_latest(newer_than=self.last_seq, timeout=0.1)
+            if slot is None:
+                continue
+            info = slot.info
+            self.frames.release(slot)
+            self.last_seq = info.seq
+
+            time.sleep(self.latency)
+            heatmaps, nms_heatmaps, embeddings = inputs[info.seq % len(inputs)]
+            poses, _ = decoder(heatmaps.copy(), embeddings, nms_heatmaps=nms_heatmaps)
+            poses = poses[..., :3].copy()
+            poses[..., :2] /= (heatmaps.shape[3], heatmaps.shape[2])
+            self.joints_deque.append(PoseResult(info, Poses(poses), list(range(len(poses)))))
+            if self.result_event is not None:
+                self.result_event.set()
+
+    def stop(self):
+        self._keep_running = False
+
+
+class CountingDeque(collections.deque):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.appended = 0
+
+    def append(self, item):
+        super().append(item)
+        self.appended += 1
+
+
+def bench_process(args):
+    import functools
+    import threading
+
+    from inference_process import InferenceProcess
+    shape = (args.height, args.width, 3)
+    factory = functools.partial(SyntheticInferenceThread, latency=args.latency, people=args.people)
+    print(f'Inference with {args.latency * 1000:.0f} ms device latency and {args.people} people, '
+          f'display at {args.fps} fps for {args.duration:.0f} s:')
+    print(f'  {"mode":>8} {"results":>11} {"display p50":>11} {"p99":>9} {"max":>9}')
+    for mode in ('thread', 'process'):
+        frames = FrameRing(shape, args.ring_size, shared=True)
+        joints_deque = CountingDeque(maxlen=4)
+        keep_feeding = threading.Event()
+        keep_feeding.set()
+
+        def feed():
+            source = np.random.default_rng(0).integers(0, 256, shape, dtype=np.uint8)
+            while keep_feeding.is_set():
+                slot = frames.acquire_write()
+                if slot is not None:
+                    np.copyto(slot.buffer, source)
+                    frames.publish(slot, time.perf_counter())
+                time.sleep(1 / 30)
+
+        feeder = threading.Thread(target=feed)
+        if mode == 'thread':
+            inference = factory(frames, joints_deque, shape)
+        else:
+            inference = InferenceProcess(frames, joints_deque, shape, factory=factory)
+        feeder.start()
+        inference.start()
+
+        # Wait for the first result, so that start up of the worker does not count
+        while not joints_deque and inference.is_alive():
+            time.sleep(0.01)
+        first_results = joints_deque.appended
+        start = time.perf_counter()
+        iterations = []
+        while time.perf_counter() - start < args.duration and inference.is_alive():
+            iteration_start = time.perf_counter()
+            # Display stand-in: latest joints turned into per-joint Python work, as drawing and hit tests do
+            checksum = 0.0
+            for person in joints_deque[-1].joints.data.tolist():
+                for x, y, score in person:
+                    checksum += x * y * score
+            iterations.append(time.perf_counter() - iteration_start)
+            time.sleep(max(1 / args.fps - iterations[-1], 0))
+        elapsed = time.perf_counter() - start
+        results = joints_deque.appended - first_results
+
+        inference.stop()
+        inference.join()
+        keep_feeding.clear()
+        feeder.join()
+        frames.close()
+
+        iterations = np.array(iterations) * 1000
+        print(f'  {mode:>8} {results / elapsed:7.1f} / s {np.percentile(iterations, 50):8.3f} ms '
+              f'{np.percentile(iterations, 99):6.3f} ms {iterations.max():6.3f} ms')
+    print('  Display times are of the work in a loop iteration, without its sleep')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    capture_parser = subparsers.add_parser('capture', help='Frame ring buffer against per-frame allocation')
+    capture_parser.add_argument('--frames', type=int, default=600)
+    capture_parser.add_argument('--width', type=int, default=1920)
+    capture_parser.add_argument('--height', type=int, default=1080)
+    capture_parser.add_argument('--ring-size', type=int, default=5)
+    capture_parser.add_argument('--camera', type=int, default=None,
+                                help='Read from a camera instead of synthetic frames')
+    capture_parser.set_defaults(func=bench_capture)
+
+    preprocess_parser = subparsers.add_parser('preprocess', help='Fused resize into input tensor against the old path')
+    preprocess_parser.add_argument('--frames', type=int, default=500)
+    preprocess_parser.add_argument('--net-width', type=int, default=256)
+    preprocess_parser.set_defaults(func=bench_preprocess)
+
+    decoder_parser = subparsers.add_parser('decoder', help='Associative embedding decoder time per frame')
+    decoder_parser.add_argument('--frames', type=int, default=200)
+    decoder_parser.add_argument('--people', type=int, default=10)
+    decoder_parser.add_argument('--record', help='.npz with recorded heatmaps, nms_heatmaps and embeddings')
+    decoder_parser.set_defaults(func=bench_decoder)
+
+    joints_parser = subparsers.add_parser('joints', help='Joint arrays against lists of joint tuples')
+    joints_parser.add_argument('--frames', type=int, default=2000)
+    joints_parser.add_argument('--people', type=int, default=2)
+    joints_parser.set_defaults(func=bench_joints)
+
+    hits_parser = subparsers.add_parser('hits', help='Vectorized hit tests against the scalar ones')
+    hits_parser.add_argument('--targets', type=int, nargs='+', default=[10, 100, 500])
+    hits_parser.add_argument('--players', type=int, nargs='+', default=[1, 2, 4])
+    hits_parser.set_defaults(func=bench_hits)
+
+    entities_parser = subparsers.add_parser('entities', help='Gameplay update and drawing time with many objects')
+    entities_parser.add_argument('--targets', type=int, nargs='+', default=[10, 100, 300, 1000])
+    entities_parser.set_defaults(func=bench_entities)
+
+    timestep_parser = subparsers.add_parser('timestep', help='Game speed at frame rates with and without fixed steps')
+    timestep_parser.add_argument('--fps', type=int, nargs='+', default=[60, 30, 20, 12])
+    timestep_parser.add_argument('--duration', type=float, default=2.0)
+    timestep_parser.add_argument('--jitter', type=float, default=0.3, help='Relative spread of frame intervals')
+    timestep_parser.set_defaults(func=bench_timestep)
+
+    cadence_parser = subparsers.add_parser('cadence', help='Hit accuracy of interpolated joints at inference intervals')
+    cadence_parser.add_argument('--session', help='.npz session recorded with config.recording.session_path')
+    cadence_parser.add_argument('--max-interval', type=int, default=4)
+    cadence_parser.add_argument('--latency', type=float, default=0.05, help='Seconds before a result arrives')
+    cadence_parser.add_argument('--max-extrapolation', type=float, default=0.1)
+    cadence_parser.set_defaults(func=bench_cadence)
+
+    smoothing_parser = subparsers.add_parser('smoothing', help='Joint error and jitter of the smoothing filters')
+    smoothing_parser.add_argument('--session', help='.npz session recorded with config.recording.session_path')
+    smoothing_parser.add_argument('--noise', type=float, default=0.008,
+                                  help='Standard deviation of synthetic joint noise relative to frame size')
+    smoothing_parser.set_defaults(func=bench_smoothing)
+
+    startup_parser = subparsers.add_parser('startup', help='Network load time without, with a cold and a warm cache')
+    startup_parser.add_argument('--net-width', type=int, default=256)
+    startup_parser.add_argument('--width', type=int, default=1280, help='Capture width')
+    startup_parser.add_argument('--height', type=int, default=720, help='Capture height')
+    startup_parser.set_defaults(func=bench_startup)
+
+    imports_parser = subparsers.add_parser('imports', help='Import time of modules, fails on heavy imports')
+    imports_parser.add_argument('--repeat', type=int, default=3)
+    imports_parser.add_argument('--top', type=int, default=3, help='Number of heaviest imports to show')
+    imports_parser.add_argument('--budget', type=float, default=None,
+                                help='Milliseconds any guarded module may take to import')
+    imports_parser.set_defaults(func=bench_imports)
+
+    process_parser = subparsers.add_parser('process', help='Display stalls and throughput of threaded against '
+                                                           'process inference')
+    process_parser.add_argument('--duration', type=float, default=10.0)
+    process_parser.add_argument('--fps', type=int, default=60, help='Display loop rate')
+    process_parser.add_argument('--latency', type=float, default=0.02, help='Seconds of emulated device latency')
+    process_parser.add_argument('--people', type=int, default=4)
+    process_parser.add_argument('--width', type=int, default=1280, help='Capture width')
+    process_parser.add_argument('--height', type=int, default=720, help='Capture height')
+    process_parser.add_argument('--ring-size', type=int, default=5)
+    process_parser.set_defaults(func=bench_process)
+
+    motion_parser = subparsers.add_parser('motion', help='Inference skipped by the motion gate on a synthetic scene')
+    motion_parser.add_argument('--frames', type=int, default=900)
+    motion_parser.add_argument('--width', type=int, default=1280)
+    motion_parser.add_argument('--height', type=int, default=720)
+    motion_parser.set_defaults(func=bench_motion)
+
+    roi_parser = subparsers.add_parser('roi', help='Player region coverage and zoom on a synthetic session')
+    roi_parser.add_argument('--scale', type=float, default=0.5, help='Player size relative to the synthetic one')
+    roi_parser.add_argument('--lag', type=int, default=2, help='Frames between a result and the frame it crops')
+    roi_parser.set_defaults(func=bench_roi)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,18 +2,24 @@ import time
 from threading import Thread
 
 import cv2
+import numpy as np
 
+from config import config
+from frame_ring import FrameRing
+from pacing import RateEstimator
+from tracing import tracer
 from utils import log
 
 
 class CaptureThread(Thread):
-    def __init__(self, deque, cap_source=0):
+    def __init__(self, ring_size, cap_source=0, shared=False):
         super().__init__()
         self._keep_running = False
 
-        self.deque = deque
         self.cap_source = cap_source
         self._init_capture()
+        self.frames = self._init_frames(ring_size, shared)
+        self.input_rate = RateEstimator(config.input_rate.default_fps, smoothing=config.input_rate.smoothing)
 
     def __del__(self):
         self._release_capture()
@@ -25,6 +31,17 @@ class CaptureThread(Thread):
             log.error('Video input is not accessible')
             raise IOError
 
+    def _init_frames(self, ring_size, shared):
+        ret, frame = self.capture.read()
+        if not ret:
+            log.error('Unable to read the first frame to determine input shape')
+            raise IOError
+        frames = FrameRing(frame.shape, ring_size, dtype=frame.dtype, shared=shared)
+        slot = frames.acquire_write()
+        np.copyto(slot.buffer, frame)
+        frames.publish(slot, time.perf_counter())
+        return frames
+
     def _release_capture(self):
         log.debug('Releasing capture...')
         self.capture.release()
@@ -34,30 +51,27 @@ class CaptureThread(Thread):
             log.debug('Capture was released successfully')
 
     def get_input_shape(self):
-        self.read_next()
-        return self.deque[-1].shape
-
-    def benchmark_fps(self, num_frames):
-        log.info('Benchmarking input fps...')
-
-        start = time.time()
-        for i in range(num_frames):
-            self.capture.read()
-        end = time.time()
-
-        elapsed = end - start
-        fps = num_frames / elapsed
-        fps = int(fps)
-
-        log.info(f'Read {num_frames} frames, took {elapsed:.3f} seconds [{fps} FPS]')
-        return fps
+        return self.frames.shape
 
     def read_next(self):
-        ret, frame = self.capture.read()
+        slot = self.frames.acquire_write()
+        if slot is None:
+            log.warning('All frame buffers are held by readers; Skipping camera frame')
+            self.capture.grab()
+            return
+
+        # VideoCapture writes into the passed buffer when its shape and type match
+        start = time.perf_counter()
+        ret, frame = self.capture.read(image=slot.buffer)
+        timestamp = tracer.record('capture', start)
         if not ret:
+            self.frames.discard(slot)
             log.warning('Received empty camera frame')
             return
-        self.deque.append(frame)
+        if frame is not slot.buffer:
+            np.copyto(slot.buffer, frame)
+        info = self.frames.publish(slot, timestamp)
+        self.input_rate.update(info.seq, info.timestamp)
 
     def run(self):
         self._keep_running = True
@@ -66,3 +80,4 @@ class CaptureThread(Thread):
 
     def stop(self):
         self._keep_running = False
+        log.info(f'Estimated input rate: {self.input_rate.rate:.1f} FPS')
@@ -2,17 +2,18 @@ import logging
 import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 
 from typing.io import IO
 
+from models import get_pose_model
 from models.base_pose import PoseModel
-from models.intel_pose import IntelPoseModel
 
 
 @dataclass
 class App:
-    model: PoseModel
+    # Name of the pose model in models.POSE_MODELS
+    model_name: str = 'intel'
     root_path: Path = Path(__file__).parent.parent
     model_path: Path = root_path / 'models/intel/human-pose-estimation-0007/FP16/human-pose-estimation-0007.xml'
     neural_network_input_width: int = 256
@@ -26,6 +27,133 @@ class App:
     log_level: int = logging.DEBUG
     log_stream: IO[str] = sys.stdout
 
+    @property
+    def model(self) -> PoseModel:
+        return get_pose_model(self.model_name)
+
+
+@dataclass
+class Inference:
+    # Number of infer requests kept in flight, 0 lets the plugin pick the optimal number
+    max_requests: int = 0
+    # Throughput streams per device, e.g. '2' or 'CPU:2'; empty string means auto
+    streams: str = ''
+    threads: Optional[int] = None
+    drop_stale_results: bool = True
+    # Longest wait for a new frame while completed results may be pending
+    idle_interval: float = 0.002
+    # Run inference and postprocessing in a separate process reading frames from shared memory
+    process: bool = False
+    # Compiled networks are kept there to speed up later launches, None compiles them on every launch
+    network_cache_dir: Optional[Path] = App.root_path / 'network_cache'
+
+
+@dataclass
+class Resolution:
+    # Switch between these network input widths by inference latency instead of using neural_network_input_width
+    adaptive: bool = False
+    widths: Tuple[int, ...] = (192, 256, 320)
+    # Share of the time between inferred frames the inference latency is allowed to take
+    budget: float = 0.8
+    # Switch to a larger width only if its expected latency fits in this share of the budget
+    headroom: float = 0.7
+    # Seconds to keep a width after switching to it
+    min_dwell: float = 2.0
+
+
+@dataclass
+class Cadence:
+    # Run inference on every interval-th captured frame
+    interval: int = 1
+    # Pick the interval from the measured inference latency instead, up to max_interval
+    adaptive: bool = False
+    max_interval: int = 4
+    # Share of the frame period inference is allowed to take in adaptive mode
+    budget: float = 0.5
+    # Synthesize joints of the shown frame from the results around it instead of showing the latest ones,
+    # meant for an interval above 1 or adaptive mode
+    interpolate: bool = False
+    # Longest time joints are extrapolated past the newest result
+    max_extrapolation: float = 0.1
+
+
+@dataclass
+class MotionGate:
+    # Skip inference on frames barely differing from the last inferred one, reusing its joints
+    enabled: bool = False
+    # Frames are compared at this width, averaging out sensor noise
+    width: int = 64
+    # Mean absolute difference of gray levels, relative to their range, below which the scene becomes still
+    still_threshold: float = 0.001
+    # and above which it is moving again
+    motion_threshold: float = 0.002
+    # Frames skipped in a row at most, so that slow changes are picked up
+    max_skips: int = 15
+    # Joint scores of reused joints are multiplied by it on every skipped frame
+    confidence_decay: float = 0.95
+
+
+@dataclass
+class Roi:
+    # Infer only the region around a single tracked player, at a higher effective resolution
+    enabled: bool = False
+    # Share of the joints bounding box added on every side
+    padding: float = 0.2
+    # Smallest and largest region widths relative to the frame width; larger regions infer the full frame
+    min_size: float = 0.3
+    max_size: float = 0.8
+    # Regions are used only while at most this many people are tracked
+    max_people: int = 1
+    # Every n-th inference covers the full frame to find people entering it
+    full_frame_interval: int = 30
+
+
+@dataclass
+class Smoothing:
+    # 'one_euro', 'kalman' or empty string to show raw joints
+    method: str = 'one_euro'
+    # One Euro cutoff frequencies in Hz, the cutoff grows by beta per frame width per second of joint speed
+    min_cutoff: float = 1.0
+    beta: float = 20.0
+    d_cutoff: float = 1.0
+    # Kalman acceleration noise density and joint position noise variance, in frame widths and heights
+    process_noise: float = 0.2
+    measurement_noise: float = 1e-4
+    # Seconds a person is remembered for after leaving the frame
+    max_age: float = 0.5
+
+
+@dataclass
+class Recording:
+    # Inference results are saved there on exit, e.g. App.root_path / 'session.npz'
+    session_path: Optional[Path] = None
+
+
+@dataclass
+class Tracking:
+    enabled: bool = True
+    # Farthest a pose center may move between frames and keep its track, relative to the frame width
+    max_distance: float = 0.15
+    # Frames a track is kept for without being found
+    max_misses: int = 5
+    # Frames a track has to be found in a row before its joints are looked up only around the previous positions
+    stable_age: int = 3
+
+
+@dataclass
+class Tracing:
+    enabled: bool = True
+    # Percentiles reported at runtime cover the last one to two windows
+    window: float = 10.0
+    # Latency report of all stages is saved there on exit, e.g. App.root_path / 'latency.json'
+    dump_path: Optional[Path] = None
+
+
+@dataclass
+class Display:
+    # Render as soon as new joints arrive instead of waiting for the next deadline
+    wake_on_results: bool = True
+
 
 @dataclass
 class Graphics:
@@ -43,13 +171,15 @@ class Graphics:
     countdown_label_color: Tuple[int] = (0, 255, 255)
     countdown_label_font_scale: int = 2
     countdown_label_thickness: int = 2
+    antialiased_objects_limit: int = 50
 
 
 @dataclass
-class InputBenchmarking:
-    enabled: bool = True
-    frame_count: int = 80
+class InputRate:
+    # Assumed until the capture has measured the actual rate
     default_fps: int = 24
+    # Weight of the newest frame interval in the estimate
+    smoothing: float = 0.1
 
 
 @dataclass
@@ -60,21 +190,49 @@ class Gameplay:
     intensive_interval: int = 3
     intensive_max_circles_on_screen: int = 5
     circle_radius: int = 44
+    # Simulation steps per second, speeds and progress are per step
+    tick_rate: int = 30
+    # Steps run before a frame is drawn at most, longer stalls slow the game down instead
+    max_ticks_per_frame: int = 5
     pacman_speed: int = 5
     pacman_max_progress: int = 300
+    # Paths of mooving circles by name in trajectories.TRAJECTORIES, picked at random
+    trajectories: Tuple[str] = ('ellipse', 'figure_eight', 'lissajous', 'bezier')
+    # Longer paths are scaled down, in pixels
+    max_path_length: int = 640
 
 
 @dataclass
 class Config:
     app: App
+    inference: Inference
+    resolution: Resolution
+    cadence: Cadence
+    motion_gate: MotionGate
+    roi: Roi
+    smoothing: Smoothing
+    recording: Recording
+    tracking: Tracking
+    tracing: Tracing
+    display: Display
     graphics: Graphics
-    input_benchmarking: InputBenchmarking
+    input_rate: InputRate
     gameplay: Gameplay
 
 
 config = Config(
-    App(model=IntelPoseModel()),
+    App(),
+    Inference(),
+    Resolution(),
+    Cadence(),
+    MotionGate(),
+    Roi(),
+    Smoothing(),
+    Recording(),
+    Tracking(),
+    Tracing(),
+    Display(),
     Graphics(),
-    InputBenchmarking(),
+    InputRate(),
     Gameplay()
 )
@@ -3,24 +3,36 @@ from threading import Thread
 
 import cv2
 import keyboard
+import numpy as np
 
 import drawing
-import utils
+import interpolation
 from config import config
 from gameplay import GameWithFriendOpenVINO
-from utils import log
+from pacing import FrameScheduler
+from tracing import tracer
+from utils import Poses, log
 
 
 class DisplayThread(Thread):
-    def __init__(self, frame_deque, joints_deque, fps=24, gui=None):
+    def __init__(self, frames, joints_deque, input_rate, gui=None, result_event=None):
         super().__init__()
         self._keep_running = False
 
         self.gui = gui
-        self.frame_deque = frame_deque
+        self.frames = frames
+        # Frames are composed in a buffer owned by the display, source frames stay read-only
+        self.canvas = np.empty(frames.shape, np.uint8)
+        self.frame_info = None
+        self.joints_lag = 0
         self.joints_deque = joints_deque
         self.game = None
-        self.fps = fps
+
+        # Output follows the input rate estimated by the capture
+        self.input_rate = input_rate
+        wake_event = result_event if config.display.wake_on_results else None
+        self.scheduler = FrameScheduler(input_rate.rate, wake_event=wake_event)
+        input_rate.subscribe(self.scheduler.set_rate)
 
     def __del__(self):
         cv2.destroyAllWindows()
@@ -33,49 +45,82 @@ class DisplayThread(Thread):
         if keyboard.is_pressed(config.app.quit_key):
             self.quit_app()
 
-        if not self.frame_deque:
+        slot = self.frames.acquire_latest()
+        if slot is None:
             log.warning('No frames to display; Output fps may be set too high')
             return
-        frame = self.frame_deque[-1]
+        start = time.perf_counter()
+        try:
+            self.frame_info = slot.info
+            frame = self.copy_to_canvas(slot.frame)
+        finally:
+            self.frames.release(slot)
 
-        if self.joints_deque:
-            joints = self.joints_deque[-1]
-            drawing.draw_joints(frame, joints, skeleton=config.app.model.SKELETON)
-            for person_joints in joints:
-                drawing.draw_limb_circles(frame, person_joints, config.app.model.BODY_PART_INDEXES)
+        result = None
+        results = self.get_recent_results()
+        if results:
+            result = results[-1]
+            # Joints come from the same or an earlier frame than the one shown
+            self.joints_lag = self.frame_info.seq - result.frame.seq
+            if config.cadence.interpolate:
+                joints = interpolation.joints_at(results, self.frame_info.timestamp, config.cadence.max_extrapolation)
+            else:
+                joints = result.joints
         else:
-            joints = []
-
+            joints = Poses.empty()
         if config.app.flip_image:
-            frame = cv2.flip(frame, 1)
-            flipped_joints = [utils.flip_joints(item) for item in joints]
-        else:
-            flipped_joints = joints
+            joints = joints.flip()
+
+        drawing.draw_joints(frame, joints, skeleton=config.app.model.SKELETON)
+        drawing.draw_limb_circles(frame, joints, config.app.model.BODY_PART_INDEXES)
 
         if self.gui.start_status:
             game_status = True
             if self.gui.countdown != 0:
                 self.gui.start_prepare(frame)
             elif type(self.gui.game_mode) != GameWithFriendOpenVINO:
-                game_status = self.gui.game_mode.process(frame, flipped_joints[0] if len(flipped_joints) != 0 else [])
+                # Solo games follow the first player
+                game_status = self.gui.game_mode.process(frame, joints[:1])
             else:
-                game_status = self.gui.game_mode.process(frame, flipped_joints)
+                game_status = self.gui.game_mode.process(frame, joints)
 
             if not game_status:
                 self.gui.reset()
         else:
-            q = self.gui.process(frame, flipped_joints)
+            q = self.gui.process(frame, joints)
             if q:
                 self.quit_app()
+        compose_end = tracer.record('compose', start)
         cv2.imshow(config.app.window_name, frame)
         cv2.waitKey(1)
+        shown = tracer.record('imshow', compose_end)
+
+        tracer.record('frame_to_photon', self.frame_info.timestamp, shown)
+        if result is not None:
+            tracer.record('motion_to_photon', result.frame.timestamp, shown)
+
+    def get_recent_results(self, count=2):
+        """Newest results in capture order, the inference thread may be appending meanwhile"""
+        results = [self.joints_deque[-index] for index in range(1, min(count, len(self.joints_deque)) + 1)]
+        return sorted(results, key=lambda result: result.frame.seq)
+
+    def copy_to_canvas(self, frame):
+        """Copy the source frame into the canvas, mirroring it on the way if needed"""
+        if config.app.flip_image:
+            cv2.flip(frame, 1, dst=self.canvas)
+        else:
+            np.copyto(self.canvas, frame)
+        return self.canvas
 
     def run(self):
         self._keep_running = True
         while self._keep_running:
+            self.scheduler.wait()
             self.display_last()
-            # TODO Match fps more accurately
-            time.sleep(1 / self.fps)
+            self.scheduler.frame_done()
+
+        log.info(f'Displayed {self.scheduler.frames} frames at {self.input_rate.rate:.1f} FPS input rate, '
+                 f'missed {self.scheduler.missed_deadlines} deadlines')
 
     def stop(self):
         self._keep_running = False
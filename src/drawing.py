@@ -1,39 +1,34 @@
-from math import floor
-
 import cv2
+import numpy as np
 
 from config import config
-from utils import denormalize
+from objects import PALETTE, SIDES, Kind
 
 
 def draw_joints(image, joints, skeleton=None):
     """Draw joints and optionally the skeleton on the image"""
-    image_h, image_w, _ = image.shape
-
     # Denormalize joints coordinates and only select valid ones
-    for item in joints:
-        idx_to_coordinates = {}
-        for idx, joint in enumerate(item):
-            if joint.score < config.app.detection_threshold:
-                continue
-            joint_px = denormalize(joint.x, image_w), denormalize(joint.y, image_h)
-            idx_to_coordinates[idx] = joint_px
+    pixels = joints.to_pixels(image.shape).tolist()
+    visible = joints.visible(config.app.detection_threshold).tolist()
 
+    for person_pixels, person_visible in zip(pixels, visible):
         # Draw skeleton connections
         if skeleton:
             for connection in skeleton:
                 st_idx, en_idx = connection
-                if st_idx in idx_to_coordinates and en_idx in idx_to_coordinates:
+                if person_visible[st_idx] and person_visible[en_idx]:
                     cv2.line(
                         image,
-                        idx_to_coordinates[st_idx],
-                        idx_to_coordinates[en_idx],
+                        person_pixels[st_idx],
+                        person_pixels[en_idx],
                         config.graphics.connection_color,
                         config.graphics.connection_thickness,
                     )
 
         # Draw joints above the skeleton
-        for joint_px in idx_to_coordinates.values():
+        for joint_px, joint_visible in zip(person_pixels, person_visible):
+            if not joint_visible:
+                continue
             cv2.circle(
                 image,
                 joint_px,
@@ -43,22 +38,22 @@ def draw_joints(image, joints, skeleton=None):
             )
 
 
-def draw_circle(image, center, circle_radius, color, thickness=2):
-    cv2.circle(image, center, circle_radius, color, thickness, lineType=cv2.LINE_AA)
+def draw_circle(image, center, circle_radius, color, thickness=2, line_type=cv2.LINE_AA):
+    cv2.circle(image, center, circle_radius, color, thickness, lineType=line_type)
 
 
 def draw_limb_circles(image, joints, body_part_indexes, threshold=0.3, radius=20):
     if not joints:
         return
 
-    image_h, image_w, _ = image.shape
+    pixels = joints.to_pixels(image.shape).tolist()
+    visible = joints.visible(threshold).tolist()
 
     def draw_circles_of_indexes(indexes, color):
-        for idx in indexes:
-            if joints[idx] is None or joints[idx].score < threshold:
-                continue
-            center = (denormalize(joints[idx].x, image_w), denormalize(joints[idx].y, image_h))
-            draw_circle(image, center, radius, color)
+        for person_pixels, person_visible in zip(pixels, visible):
+            for idx in indexes:
+                if person_visible[idx]:
+                    draw_circle(image, person_pixels[idx], radius, color)
 
     hand_indexes = (body_part_indexes["R_hand"][0], body_part_indexes["L_hand"][0])
     foot_indexes = (body_part_indexes["R_foot"][0], body_part_indexes["L_foot"][0])
@@ -67,30 +62,31 @@ def draw_limb_circles(image, joints, body_part_indexes, threshold=0.3, radius=20
     draw_circles_of_indexes(foot_indexes, config.graphics.foot_color)
 
 
-def draw_objects(frame, circles, packmans, ellipse_curves, circle_radius, vectors, body_part_indexes, joints):
-    for item in circles:
-        draw_circle(frame, item.center, circle_radius, item.color)
-        cv2.putText(
-            frame,
-            item.side,
-            (item.center[0] - 4, item.center[1] + 5),
-            cv2.FONT_ITALIC, 0.55,
-            item.color,
-            2
-        )
-
-    for item in packmans:
-        center = tuple(map(floor, item.center))
-        draw_circle(frame, center, circle_radius, item.color)
-        cv2.line(
-            frame,
-            (center[0], center[1]),
-            (center[0] + circle_radius * vectors[item.last_vector][0],
-             center[1] + circle_radius * vectors[item.last_vector][1]),
-            item.color,
-            2
-        )
-
-    for item in ellipse_curves:
-        center = tuple(map(floor, item.center))
-        draw_circle(frame, center, circle_radius, item.color)
+def draw_objects(frame, entities, circle_radius, alpha=1.0):
+    """Draw objects alpha of the way from their previous to their current centers"""
+    centers = entities.previous_center + (entities.center - entities.previous_center) * alpha
+    centers = np.floor(centers).astype(int).tolist()
+    directions = np.sign(entities.velocity).astype(int).tolist()
+    # Anti-aliased circles take most of the drawing time, crowded screens get plain ones
+    line_type = cv2.LINE_AA if len(entities) <= config.graphics.antialiased_objects_limit else cv2.LINE_8
+    rows = zip(entities.kind.tolist(), centers, directions, entities.color.tolist(), entities.side.tolist())
+    for kind, center, (dx, dy), color, side in rows:
+        color = PALETTE[color]
+        draw_circle(frame, tuple(center), circle_radius, color, line_type=line_type)
+        if kind == Kind.CIRCLE:
+            cv2.putText(
+                frame,
+                SIDES[side],
+                (center[0] - 4, center[1] + 5),
+                cv2.FONT_ITALIC, 0.55,
+                color,
+                2
+            )
+        elif kind == Kind.PACKMAN:
+            cv2.line(
+                frame,
+                (center[0], center[1]),
+                (center[0] + circle_radius * dx, center[1] + circle_radius * dy),
+                color,
+                2
+            )
@@ -0,0 +1,132 @@
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from utils import FrameInfo
+
+
+class FrameSlot:
+    __slots__ = ('index', 'buffer', 'frame', 'info', 'writing', 'readers')
+
+    def __init__(self, index, buffer):
+        self.index = index
+        # Only the writer fills the buffer, readers get a read-only view of it
+        self.buffer = buffer
+        self.frame = buffer.view()
+        self.frame.flags.writeable = False
+        self.info = None
+        self.writing = False
+        self.readers = 0
+
+    @property
+    def free(self):
+        return not self.writing and self.readers == 0
+
+
+def shared_frame_buffers(buffer, shape, size, dtype):
+    """Frame arrays laid out one after another in a shared memory buffer"""
+    return list(np.ndarray((size, *shape), dtype, buffer=buffer))
+
+
+class FrameRing:
+    """
+    Fixed number of preallocated frame buffers shared between capture and its readers.
+
+    The writer acquires a free slot, fills it and publishes it as the latest frame.
+    Readers acquire the latest slot, use its read-only frame and release it when done;
+    a slot is never handed to the writer while a reader holds it or while it is the
+    latest published frame.
+
+    With shared set, buffers are allocated in shared memory so that other processes
+    can read the frames; close() frees it.
+    """
+
+    def __init__(self, shape, size, dtype=np.uint8, shared=False):
+        if size < 2:
+            raise ValueError('Frame ring needs at least two slots')
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.shared_memory = None
+        if shared:
+            frame_size = int(np.prod(self.shape)) * self.dtype.itemsize
+            self.shared_memory = shared_memory.SharedMemory(create=True, size=frame_size * size)
+            buffers = shared_frame_buffers(self.shared_memory.buf, self.shape, size, self.dtype)
+        else:
+            buffers = [np.empty(self.shape, self.dtype) for _ in range(size)]
+        self.slots = [FrameSlot(i, buffer) for i, buffer in enumerate(buffers)]
+        self._cond = threading.Condition()
+        self._latest = None
+        self._next_index = 0
+        self._published = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __bool__(self):
+        return self._latest is not None
+
+    def acquire_write(self):
+        """Return the oldest free slot for writing or None if every slot is held"""
+        with self._cond:
+            for offset in range(len(self.slots)):
+                slot = self.slots[(self._next_index + offset) % len(self.slots)]
+                if slot.free and slot is not self._latest:
+                    slot.writing = True
+                    self._next_index = (slot.index + 1) % len(self.slots)
+                    return slot
+        return None
+
+    def publish(self, slot, timestamp):
+        with self._cond:
+            slot.writing = False
+            slot.info = FrameInfo(self._published, timestamp, self.shape)
+            self._published += 1
+            self._latest = slot
+            self._cond.notify_all()
+            return slot.info
+
+    def discard(self, slot):
+        with self._cond:
+            slot.writing = False
+
+    def _has_newer(self, seq):
+        return self._latest is not None and self._latest.info.seq > seq
+
+    def acquire_latest(self, newer_than=None, timeout=None):
+        """
+        Return the latest published slot, which stays untouched by the writer until released.
+
+        If newer_than is given, wait up to timeout seconds for a frame with a greater
+        sequence number and return None if none arrives.
+        """
+        with self._cond:
+            if newer_than is None:
+                newer_than = -1
+            elif not self._has_newer(newer_than):
+                self._cond.wait_for(lambda: self._has_newer(newer_than), timeout)
+            if not self._has_newer(newer_than):
+                return None
+            slot = self._latest
+            slot.readers += 1
+            return slot
+
+    def release(self, slot):
+        with self._cond:
+            if slot.readers <= 0:
+                raise RuntimeError(f'Frame slot {slot.index} is released more times than acquired')
+            slot.readers -= 1
+
+    def close(self):
+        """Free the shared memory of the frames, which must not be used anymore"""
+        if self.shared_memory is None:
+            return
+        self.slots = []
+        self._latest = None
+        try:
+            self.shared_memory.close()
+        except BufferError:
+            # Some frame is still referenced, the memory is unmapped on exit instead
+            pass
+        self.shared_memory.unlink()
+        self.shared_memory = None
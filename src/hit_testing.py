@@ -0,0 +1,58 @@
+"""
+Hit testing of limb joints against circular targets.
+
+Every limb joint gets a code bit for its side and part, every target a mask of the codes it
+accepts, so that side and part requirements of all targets and joints are checked with a
+single bitwise and.
+"""
+import functools
+
+import numpy as np
+
+SIDES = ('L', 'R')
+PARTS = ('hand', 'foot')
+ANY_LIMB = (1 << len(SIDES) * len(PARTS)) - 1
+
+
+def limb_code(side, part):
+    return 1 << SIDES.index(side) * len(PARTS) + PARTS.index(part)
+
+
+def target_mask(side=None, part=None):
+    """Mask of the limbs a target accepts, None accepts any side or part"""
+    mask = 0
+    for limb_side in SIDES:
+        for limb_part in PARTS:
+            if side in (None, limb_side) and part in (None, limb_part):
+                mask |= limb_code(limb_side, limb_part)
+    return mask
+
+
+@functools.lru_cache()
+def _limb_joints(body_parts):
+    indexes, codes = [], []
+    for body_part, joint_indexes in body_parts:
+        side, part = body_part.split('_')
+        indexes.extend(joint_indexes)
+        codes.extend([limb_code(side, part)] * len(joint_indexes))
+    return np.array(indexes, np.intp), np.array(codes, np.int64)
+
+
+def limb_points(poses, body_part_indexes, w_size):
+    """Pixel positions (people * limb joints, 2) and codes of the limb joints of every person"""
+    indexes, codes = _limb_joints(tuple(body_part_indexes.items()))
+    points = poses.xy[:, indexes] * (w_size[1], w_size[0])
+    return points.reshape(-1, 2), np.tile(codes, len(poses))
+
+
+def hit_matrix(centers, radii, masks, points, codes):
+    """
+    (targets, joints) matrix of the joints inside targets accepting their limb.
+
+    Targets are given by (targets, 2) centers, radii and masks, joints by (joints, 2) points and codes.
+    Unknown joints are NaN and hit nothing.
+    """
+    offsets = np.asarray(centers, np.float32).reshape(-1, 1, 2) - points[None]
+    with np.errstate(invalid='ignore'):
+        inside = np.einsum('tjk,tjk->tj', offsets, offsets) <= np.square(radii).reshape(-1, 1)
+    return inside & (np.asarray(masks, np.int64).reshape(-1, 1) & codes[None] != 0)
@@ -0,0 +1,182 @@
+"""
+Inference in a separate process, so that postprocessing never competes with the display for the GIL.
+
+Frames stay in a FrameRing allocated in shared memory. The worker asks the parent for the latest
+frame, the parent holds its slot until the worker releases it and the worker sends joints back
+as arrays. The worker runs the same inference thread class as the threaded mode, only with
+a frame ring and a joints deque standing in for the ones of the parent.
+"""
+import multiprocessing
+import queue
+import traceback
+from multiprocessing import shared_memory
+from threading import Thread
+
+import numpy as np
+
+from config import config
+from frame_ring import FrameSlot, shared_frame_buffers
+from pacing import RateEstimator
+from tracing import tracer
+from utils import PoseResult, Poses, log
+
+
+def openvino_inference(*args, **kwargs):
+    # Imported in the worker only, the parent never loads OpenVINO
+    from openvino_inference import OpenvinoInferenceThread
+    return OpenvinoInferenceThread(*args, **kwargs)
+
+
+class WorkerFrames:
+    """FrameRing interface of the worker, frames are requested from the parent"""
+
+    def __init__(self, buffers, to_worker, to_parent, input_rate):
+        self.shape = buffers[0].shape
+        self.slots = [FrameSlot(index, buffer) for index, buffer in enumerate(buffers)]
+        self.to_worker = to_worker
+        self.to_parent = to_parent
+        self.input_rate = input_rate
+        self.on_stop = None
+
+    def acquire_latest(self, newer_than=None, timeout=None):
+        self.to_parent.put(('acquire', newer_than, timeout))
+        message = self.to_worker.get()
+        if message[0] == 'stop':
+            if self.on_stop is not None:
+                self.on_stop()
+            return None
+        if message[0] == 'none':
+            return None
+
+        _, index, info = message
+        slot = self.slots[index]
+        slot.info = info
+        self.input_rate.update(info.seq, info.timestamp)
+        return slot
+
+    def release(self, slot):
+        self.to_parent.put(('release', slot.index))
+
+
+class WorkerResults:
+    """Joints deque interface of the worker, results are sent to the parent as arrays"""
+
+    def __init__(self, to_parent):
+        self.to_parent = to_parent
+
+    def append(self, result):
+        self.to_parent.put(('result', result.frame, result.joints.data, np.asarray(result.track_ids, np.int64)))
+
+
+def run_worker(factory, memory_name, shape, size, dtype, capture_shape, to_worker, to_parent):
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        from session import SessionRecorder
+
+        input_rate = RateEstimator(config.input_rate.default_fps, smoothing=config.input_rate.smoothing)
+        frames = WorkerFrames(shared_frame_buffers(memory.buf, shape, size, dtype), to_worker, to_parent, input_rate)
+        recorder = SessionRecorder() if config.recording.session_path else None
+        inference = factory(frames, WorkerResults(to_parent), capture_shape, input_rate=input_rate, recorder=recorder)
+        frames.on_stop = inference.stop
+        inference.run()
+
+        if recorder is not None:
+            recorder.save(config.recording.session_path)
+        # The parent logs and dumps the inference stages along with its own ones
+        to_parent.put(('stats', tracer.stages))
+    except Exception:
+        to_parent.put(('error', traceback.format_exc()))
+    finally:
+        to_parent.put(('done',))
+        try:
+            memory.close()
+        except BufferError:
+            # Frames are still referenced, the memory is unmapped on exit instead
+            pass
+
+
+class InferenceProcess(Thread):
+    """
+    Parent side of the inference process, serving it frames and collecting its results.
+
+    factory builds the inference thread in the worker, it is called with the same arguments as
+    OpenvinoInferenceThread and has to be picklable.
+    """
+
+    def __init__(self, frames, joints_deque, capture_shape, result_event=None, factory=openvino_inference):
+        super().__init__()
+        self._keep_running = False
+
+        if frames.shared_memory is None:
+            raise ValueError('Frames have to be allocated in shared memory')
+        self.frames = frames
+        self.joints_deque = joints_deque
+        self.result_event = result_event
+        # Slots held for the worker by their index
+        self.held = {}
+        self.results = 0
+
+        context = multiprocessing.get_context('spawn')
+        self.to_worker = context.Queue()
+        self.to_parent = context.Queue()
+        self.process = context.Process(
+            target=run_worker,
+            args=(factory, frames.shared_memory.name, frames.shape, len(frames), frames.dtype, capture_shape,
+                  self.to_worker, self.to_parent),
+            daemon=True,
+        )
+
+    def handle(self, message):
+        """Serve a message of the worker, returns True once the worker is done"""
+        kind = message[0]
+        if kind == 'acquire':
+            _, newer_than, timeout = message
+            slot = None if not self._keep_running else self.frames.acquire_latest(newer_than, timeout)
+            if not self._keep_running:
+                self.to_worker.put(('stop',))
+            elif slot is None:
+                self.to_worker.put(('none',))
+            else:
+                self.held[slot.index] = slot
+                self.to_worker.put(('frame', slot.index, slot.info))
+        elif kind == 'release':
+            self.frames.release(self.held.pop(message[1]))
+        elif kind == 'result':
+            _, info, joints, track_ids = message
+            self.joints_deque.append(PoseResult(info, Poses(joints), track_ids.tolist()))
+            self.results += 1
+            if self.result_event is not None:
+                self.result_event.set()
+        elif kind == 'stats':
+            tracer.merge(message[1])
+        elif kind == 'error':
+            log.error(f'Inference process has failed:\n{message[1]}')
+        elif kind == 'done':
+            return True
+        return False
+
+    def run(self):
+        self._keep_running = True
+        self.process.start()
+        done = False
+        while not done:
+            try:
+                message = self.to_parent.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    log.error('Inference process has exited unexpectedly')
+                    break
+                continue
+            done = self.handle(message)
+
+        for slot in self.held.values():
+            self.frames.release(slot)
+        self.held.clear()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            log.warning('Inference process has not exited in time; Terminating it')
+            self.process.terminate()
+        log.debug(f'Received {self.results} results from the inference process')
+
+    def stop(self):
+        self._keep_running = False
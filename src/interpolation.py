@@ -0,0 +1,55 @@
+import numpy as np
+
+from utils import Poses
+
+
+def blend_results(previous, latest, alpha):
+    """
+    Joints moved from previous to latest by alpha of the way, people are matched by track id.
+
+    Alpha above one extrapolates the motion. People or joints missing from previous are taken from latest.
+    """
+    end = latest.joints.data
+    rows = {track_id: row for row, track_id in enumerate(previous.track_ids)}
+    rows = np.array([rows.get(track_id, -1) for track_id in latest.track_ids], np.int64)
+    matched = rows >= 0
+    if not matched.any() or previous.joints.data.shape[1] != end.shape[1]:
+        return latest.joints
+
+    start = previous.joints.data[rows[matched]]
+    blended = end[matched].copy()
+    blended[..., :2] = start[..., :2] + (blended[..., :2] - start[..., :2]) * alpha
+    np.clip(blended[..., :2], 0, 1, out=blended[..., :2])
+    if alpha < 1:
+        blended[..., 2] = np.minimum(start[..., 2], blended[..., 2])
+    # Joints unknown in either result stay as in latest
+    unknown = np.isnan(blended).any(axis=2)
+    blended[unknown] = end[matched][unknown]
+
+    people = end.copy()
+    people[matched] = blended
+    return Poses(people)
+
+
+def joints_at(results, timestamp, max_extrapolation=0.1):
+    """
+    Joints at the given capture timestamp from results in capture order.
+
+    They are interpolated between the results around the timestamp or extrapolated from the
+    latest two, but not further than max_extrapolation seconds past the latest result.
+    """
+    if not results:
+        return Poses.empty()
+    later = next((index for index, result in enumerate(results) if result.frame.timestamp >= timestamp), None)
+    if later == 0 or len(results) == 1:
+        return results[0 if later == 0 else -1].joints
+    if later is None:
+        later = len(results) - 1
+    previous, latest = results[later - 1], results[later]
+
+    start, end = previous.frame.timestamp, latest.frame.timestamp
+    if end <= start or timestamp == end:
+        return latest.joints
+    alpha = (timestamp - start) / (end - start)
+    alpha = min(alpha, 1 + max_extrapolation / (end - start))
+    return blend_results(previous, latest, alpha)
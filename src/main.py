@@ -1,30 +1,38 @@
 import collections
+import threading
 
 from GUI import GUI
 from capture import CaptureThread
 from config import config
 from display import DisplayThread
 from gameplay import SoloIntensiveFastAim
+from inference_process import InferenceProcess
 from openvino_inference import OpenvinoInferenceThread
+from session import SessionRecorder
+from tracing import tracer
 
 
 def main():
-    frame_deque = collections.deque(maxlen=config.app.max_frames_stored)
     joints_deque = collections.deque(maxlen=config.app.max_joints_stored)
+    results_ready = threading.Event()
 
-    input_thread = CaptureThread(frame_deque)
-
-    if config.input_benchmarking.enabled:
-        input_fps = input_thread.benchmark_fps(config.input_benchmarking.frame_count)
-    else:
-        input_fps = config.input_benchmarking.default_fps
-
+    input_thread = CaptureThread(config.app.max_frames_stored, shared=config.inference.process)
+    frames = input_thread.frames
     input_shape = input_thread.get_input_shape()
 
-    inference_thread = OpenvinoInferenceThread(frame_deque, joints_deque, capture_shape=input_shape)
+    recorder = None
+    if config.inference.process:
+        # The inference process records the session itself
+        inference_thread = InferenceProcess(frames, joints_deque, capture_shape=input_shape, result_event=results_ready)
+    else:
+        recorder = SessionRecorder() if config.recording.session_path else None
+        inference_thread = OpenvinoInferenceThread(frames, joints_deque, capture_shape=input_shape,
+                                                   result_event=results_ready, input_rate=input_thread.input_rate,
+                                                   recorder=recorder)
 
     gui = GUI(input_shape)
-    display_thread = DisplayThread(frame_deque, joints_deque, fps=input_fps, gui=gui)
+    display_thread = DisplayThread(frames, joints_deque, input_thread.input_rate, gui=gui,
+                                   result_event=results_ready)
 
     # Start all threads
     input_thread.start()
@@ -41,6 +49,14 @@ def main():
     # Wait for other threads to finish
     input_thread.join()
     inference_thread.join()
+    frames.close()
+
+    if recorder is not None:
+        recorder.save(config.recording.session_path)
+
+    tracer.log_summary(rolling=False)
+    if config.tracing.enabled and config.tracing.dump_path:
+        tracer.dump(config.tracing.dump_path)
 
 
 if __name__ == '__main__':
@@ -3,34 +3,51 @@ from threading import Thread
 import cv2
 from mediapipe.python.solutions import pose
 
+from config import config
 from models.mediapipe_pose import MediapipePoseModel
-from utils import log
+from pacing import InferenceCadence
+from smoothing import create_filter, smooth_result
+from utils import PoseResult
 
 
 class MediapipeInferenceThread(Thread):
-    def __init__(self, frame_deque, joints_deque):
+    def __init__(self, frames, joints_deque, result_event=None):
         super().__init__()
         self._keep_running = False
 
-        self.frame_deque = frame_deque
+        self.frames = frames
         self.joints_deque = joints_deque
+        self.result_event = result_event
 
         # Initialize Mediapipe engine
         self.pose_instance = pose.Pose()
+        self.last_seq = -1
+        self.cadence = InferenceCadence(interval=config.cadence.interval)
+        self.joint_filter = create_filter(config.smoothing)
 
     def process_last(self):
-        if not self.frame_deque:
-            log.warning('No frames to process; Input fps may be too low')
+        newer_than = self.cadence.next_seq(self.last_seq) - 1
+        slot = self.frames.acquire_latest(newer_than=newer_than, timeout=config.inference.idle_interval)
+        if slot is None:
             return
-        frame = self.frame_deque[-1]
-
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        try:
+            info = slot.info
+            frame = cv2.cvtColor(slot.frame, cv2.COLOR_BGR2RGB)
+        finally:
+            self.frames.release(slot)
+        self.last_seq = info.seq
         frame.flags.writeable = False
 
         result = self.pose_instance.process(frame)
         joints = MediapipePoseModel.get_joints_from_result(result)
-
-        self.joints_deque.append(joints)
+        track_ids = MediapipePoseModel.get_track_ids_from_result(result)
+
+        result = PoseResult(info, joints, track_ids)
+        if self.joint_filter is not None:
+            result = smooth_result(self.joint_filter, result)
+        self.joints_deque.append(result)
+        if self.result_event is not None:
+            self.result_event.set()
 
     def run(self):
         self._keep_running = True
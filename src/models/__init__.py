@@ -0,0 +1,16 @@
+import importlib
+from functools import lru_cache
+
+# Pose models by name, each is imported on first use
+POSE_MODELS = {
+    'intel': ('models.intel_pose', 'IntelPoseModel'),
+    'mediapipe': ('models.mediapipe_pose', 'MediapipePoseModel'),
+}
+
+
+@lru_cache(maxsize=None)
+def get_pose_model(name):
+    if name not in POSE_MODELS:
+        raise ValueError(f'Unknown pose model {name}, available ones are {", ".join(POSE_MODELS)}')
+    module_name, class_name = POSE_MODELS[name]
+    return getattr(importlib.import_module(module_name), class_name)()
@@ -1,15 +1,24 @@
 import enum
 from typing import Optional, Any, List
 
-from utils import Joint
+from utils import Poses
 
 
 class PoseModel:
 
     @staticmethod
-    def get_joints_from_result(result: Optional[Any]) -> List[Joint]:
+    def get_joints_from_result(result: Optional[Any]) -> Poses:
         """
-        Get list of joints from neural net output.
+        Get joints of people from neural net output.
+
+        If result is None, returns empty poses.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def get_track_ids_from_result(result: Optional[Any]) -> List[int]:
+        """
+        Get track ids of the people returned by get_joints_from_result, in the same order.
 
         If result is None, returns empty list.
         """
@@ -1,30 +1,16 @@
 import enum
 
-from models.base_pose import PoseModel
-from utils import Joint, normalize, log
-
-
-def distance(p1, p2):
-    return ((p1.x - p2.x)**2 + (p1.y - p2.y)**2)**(1/2)
-
-
-def get_sin(elbow_p, wrist_p, c):
-    return (wrist_p.y - elbow_p.y) / c
-
-
-def get_cos(elbow_p, wrist_p, c):
-    return (wrist_p.x - elbow_p.x) / c
+import numpy as np
 
+from models.base_pose import PoseModel
+from utils import Poses, log
 
-def get_additional_joint(divider, elbow_p, wrist_p):
-    cos_a = get_cos(elbow_p, wrist_p, divider)
-    sin_a = get_sin(elbow_p, wrist_p, divider)
 
-    a = sin_a / divider
-    b = cos_a / divider
-    if not (0 <= wrist_p.x + b <= 1 and 0 <= wrist_p.y + a <= 1):
-        return wrist_p
-    return Joint(wrist_p.x + b, wrist_p.y + a, wrist_p.score)
+def get_additional_joints(divider, elbows, wrists):
+    """Points past the wrists continuing the forearms by 1 / divider ** 2 of their length, wrists if out of the frame"""
+    points = wrists + (wrists - elbows) / divider ** 2
+    inside = ((points >= 0) & (points <= 1)).all(axis=-1, keepdims=True)
+    return np.where(inside, points, wrists)
 
 
 class IntelPoseModel(PoseModel):
@@ -32,27 +18,34 @@ class IntelPoseModel(PoseModel):
     @staticmethod
     def get_joints_from_result(result=None):
         if result is None:
-            return []
+            return Poses.empty()
 
         try:
-            (poses, scores), frame_meta = result
+            (poses, scores, track_ids), frame_meta = result
             if len(poses) < 1:
-                return []
-            img_rows, img_cols, _ = frame_meta['frame'].shape
-            joints = []
-            for ind, pose in enumerate(poses):
-                if ind == 2:
-                    break
-                joints.append([Joint(normalize(x, img_cols), normalize(y, img_rows), score) for x, y, score, _ in pose])
-                # Replace wrist on hand
-                joints[ind][9] = get_additional_joint(2, joints[ind][7], joints[ind][9])
-                joints[ind][10] = get_additional_joint(2, joints[ind][8], joints[ind][10])
-
+                return Poses.empty()
+            # People tracked for the longest time come first so that players keep their places
+            poses = poses[IntelPoseModel.get_players_order(track_ids), :, :3]
+            joints = Poses.from_pixels(poses, frame_meta['frame'].shape)
+            # Replace wrists on hands
+            xy = joints.xy
+            xy[:, 9:11] = get_additional_joints(2, xy[:, 7:9], xy[:, 9:11])
             return joints
         except Exception:
             log.error("Unable to convert result to joints")
             raise
 
+    @staticmethod
+    def get_players_order(track_ids, max_players=2):
+        return np.argsort(track_ids, kind='stable')[:max_players]
+
+    @staticmethod
+    def get_track_ids_from_result(result=None):
+        if result is None:
+            return []
+        (_, _, track_ids), _ = result
+        return [int(i) for i in np.asarray(track_ids)[IntelPoseModel.get_players_order(track_ids)]]
+
     BODY_PART_INDEXES = {
         "L_hand": (9,),
         "R_hand": (10,),
@@ -1,7 +1,9 @@
 import enum
 
+import numpy as np
+
 from models.base_pose import PoseModel
-from utils import Joint, log
+from utils import Poses, log
 
 
 class MediapipePoseModel(PoseModel):
@@ -9,17 +11,22 @@ class MediapipePoseModel(PoseModel):
     @staticmethod
     def get_joints_from_result(result=None):
         if result is None or result.pose_landmarks is None:
-            return []
+            return Poses.empty()
 
         try:
-            joints = [
-                [Joint(landmark.x, landmark.y, landmark.visibility) for landmark in result.pose_landmarks.landmark]
-            ]
-            return joints
+            landmarks = result.pose_landmarks.landmark
+            return Poses(np.array([[(landmark.x, landmark.y, landmark.visibility) for landmark in landmarks]]))
         except Exception:
             log.error("Unable to convert result to joints")
             raise
 
+    @staticmethod
+    def get_track_ids_from_result(result=None):
+        # Mediapipe tracks a single person
+        if result is None or result.pose_landmarks is None:
+            return []
+        return [0]
+
     BODY_PART_INDEXES = {
         "L_hand": (21, 19, 17, 15),
         "R_hand": (20, 22, 18, 16),
@@ -1,70 +1,121 @@
+import random
+
+import numpy as np
+
 from config import config
-from objects import DefaultCircle, Packman, MoovingCircle
-from random import randint, shuffle
-
-
-def circle_includes(circle,
-                    body_part,
-                    landmarks,
-                    radius,
-                    body_part_indexes,
-                    w_size,
-                    side_required=True,
-                    body_part_required=True):
-
-    for index in body_part_indexes[body_part]:
-        if landmarks[index] is None:
-            continue
-        lxs = (landmarks[index].x * w_size[1] - circle.center[0]) ** 2
-        lys = (landmarks[index].y * w_size[0] - circle.center[1]) ** 2
-
-        if lxs + lys <= radius ** 2:
-            side, part = body_part.split("_")
-            need_part = "hand" if circle.color == config.graphics.hand_color else "foot"
-            if (not side_required or side == circle.side) and (part == need_part or not body_part_required):
-                return True
-    return False
-
-
-class DefaultCircleManager:
-    def __init__(self, w_size):
+from hit_testing import ANY_LIMB, hit_matrix, limb_points, target_mask
+from objects import MAX_PATH_POINTS, SIDES, Color, Kind, pad_path
+from trajectories import path
+
+
+def targets_hit(centers, landmarks, body_part_indexes, radius, w_size, masks=None):
+    """Mask of the targets at centers hit by a limb of any person, masks are the limbs accepted by every target"""
+    if not len(centers) or not landmarks:
+        return np.zeros(len(centers), bool)
+    points, codes = limb_points(landmarks, body_part_indexes, w_size)
+    if masks is None:
+        masks = np.full(len(centers), ANY_LIMB)
+    return hit_matrix(centers, np.full(len(centers), radius), masks, points, codes).any(axis=1)
+
+
+class ObjectManager:
+    """Objects of a kind in the entity store shared by the managers of a game"""
+    kind = None
+
+    def __init__(self, w_size, entities, rng=random):
         self.w_size = w_size
-        self.colors = [config.graphics.hand_color, config.graphics.foot_color]
+        self.entities = entities
+        # random module or a seeded random.Random
+        self.rng = rng
+
+    def rows(self):
+        return self.entities.rows(self.kind)
+
+    def items(self):
+        return [self.entities[row] for row in self.rows().tolist()]
+
+    def clear(self):
+        self.entities.remove(self.rows())
+
+    def hits(self, rows, landmarks, body_part_indexes, radius):
+        return targets_hit(self.entities.center[rows], landmarks, body_part_indexes, radius, self.w_size,
+                           self.entities.mask[rows])
+
+
+class DefaultCircleManager(ObjectManager):
+    kind = Kind.CIRCLE
+
+    def __init__(self, w_size, entities, rng=random):
+        super().__init__(w_size, entities, rng)
+        self.colors = [Color.HAND, Color.FOOT]
         self.sides = ["L", "R"]
-        self.circles = []
 
     def add(self, circle_radius, hands_only=True):
-        center = (randint(circle_radius, self.w_size[1] - circle_radius),
-                  randint(circle_radius, self.w_size[0] - circle_radius))
-        color = self.colors[0 if hands_only else randint(0, 1)]
-        side = self.sides[randint(0, 1)]
+        center = (self.rng.randint(circle_radius, self.w_size[1] - circle_radius),
+                  self.rng.randint(circle_radius, self.w_size[0] - circle_radius))
+        color = self.colors[0 if hands_only else self.rng.randint(0, 1)]
+        side = self.sides[self.rng.randint(0, 1)]
+        mask = target_mask(side, "hand" if color == Color.HAND else "foot")
 
-        self.circles.append(DefaultCircle(center, color, side))
+        self.entities.add(kind=self.kind, center=center, previous_center=center, color=color, side=SIDES.index(side),
+                          mask=mask)
 
     def pop_out(self, landmarks, body_part_indexes, radius):
-        score_count = 0
-        for item in self.circles:
-            for body_part in body_part_indexes:
-                if circle_includes(item,
-                                   body_part,
-                                   landmarks,
-                                   radius,
-                                   body_part_indexes,
-                                   self.w_size
-                                   ):
-                    score_count += 1
-                    self.circles.remove(item)
-
-        return score_count
-
-
-class PackmanManager:
-    def __init__(self, w_size):
+        rows = self.rows()
+        hits = self.hits(rows, landmarks, body_part_indexes, radius)
+        self.entities.remove(rows[hits])
+
+        return int(hits.sum())
+
+
+class PathManager(ObjectManager):
+    """
+    Objects moving along their path, see trajectories.path. Once hit for the first time an object
+    moves a point per step and pops out at the end of its path, scoring if it was hit on enough
+    of the steps.
+    """
+    speed = None
+    min_accuracy = None
+
+    def follow_paths(self, rows):
+        entities = self.entities
+        indexes = np.minimum(entities.progress[rows] // self.speed, MAX_PATH_POINTS - 1).astype(np.intp)
+        points = entities.path[rows, indexes]
+        velocity = points - entities.center[rows]
+        # Objects at the end of their path keep their last direction
+        moved = velocity.any(axis=1)
+        entities.velocity[rows[moved]] = velocity[moved]
+        entities.center[rows] = points
+
+    def pop_out(self, landmarks, body_part_indexes, circle_radius):
+        entities = self.entities
+        rows = self.rows()
+        if not len(rows):
+            return 0
+        include = self.hits(rows, landmarks, body_part_indexes, circle_radius)
+        entities.color[rows] = np.where(include, Color.ACTIVE, Color.IDLE)
+        entities.earned_progress[rows] += include * self.speed
+        progress = entities.progress[rows]
+        progress += (include | (progress != 0)) * self.speed
+        entities.progress[rows] = progress
+        self.follow_paths(rows)
+
+        done = rows[progress >= entities.length[rows]]
+        accuracy = entities.earned_progress[done] / entities.progress[done]
+        entities.remove(done)
+
+        return 3 * int(np.count_nonzero(accuracy >= self.min_accuracy))
+
+
+class PackmanManager(PathManager):
+    kind = Kind.PACKMAN
+    min_accuracy = 0.8
+
+    def __init__(self, w_size, entities, rng=random):
         # packman is fast but trajectory is easy
-        self.w_size = w_size
+        super().__init__(w_size, entities, rng)
         self.vectors = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        self.p_speed = config.gameplay.pacman_speed
-        self.packmans = []
+        self.speed = config.gameplay.pacman_speed
         self.max_packman_progress = config.gameplay.pacman_max_progress
 
     def circle_in_area(self, center, circle_radius):
@@ -72,118 +123,67 @@ class PackmanManager:
         y_valid = circle_radius < center[1] < self.w_size[0] - circle_radius
         return x_valid and y_valid
 
+    def walk(self, center, direction, circle_radius):
+        """Random walk of a packman, mostly straight ahead and turning at the borders"""
+        points = [center]
+        dx, dy = direction
+        for _ in range(self.max_packman_progress // self.speed - 1):
+            # Turns to the left and to the right of the current direction
+            turns = ((dy, -dx), (-dy, dx))
+            vector_priority = ((dx, dy),) + turns if self.rng.randint(1, 10) <= 9 else turns
+            x, y = points[-1]
+            for new_dx, new_dy in vector_priority:
+                new_center = (x + new_dx * self.speed, y + new_dy * self.speed)
+                if self.circle_in_area(new_center, circle_radius):
+                    dx, dy = new_dx, new_dy
+                    break
+            else:
+                new_center = (x, y)
+            points.append(new_center)
+        return np.array(points, np.float32)
+
     def add(self, circle_radius):
-        center = (randint(circle_radius, self.w_size[1] - circle_radius),
-                  randint(circle_radius, self.w_size[0] - circle_radius))
-        color = (0, 0, 255)
+        center = (self.rng.randint(circle_radius, self.w_size[1] - circle_radius),
+                  self.rng.randint(circle_radius, self.w_size[0] - circle_radius))
 
         copy_vectors = self.vectors.copy()
-        shuffle(copy_vectors)
+        self.rng.shuffle(copy_vectors)
         for dx, dy in copy_vectors:
-            future_center = (center[0] + dx * self.p_speed, center[1] + dy * self.p_speed)
+            future_center = (center[0] + dx * self.speed, center[1] + dy * self.speed)
             valid_center = self.circle_in_area(future_center, circle_radius)
             if valid_center:
-                last_vector = self.vectors.index((dx, dy))
+                direction = (dx, dy)
                 break
 
-        self.packmans.append(Packman(center, color, last_vector))
+        self.entities.add(kind=self.kind, center=center, previous_center=center,
+                          velocity=(direction[0] * self.speed, direction[1] * self.speed), color=Color.IDLE,
+                          mask=ANY_LIMB, length=self.max_packman_progress,
+                          path=pad_path(self.walk(center, direction, circle_radius)))
 
-    def pop_out(self, landmarks, body_part_indexes, circle_radius):
-        score_bonus = 0
-        for index, item in enumerate(self.packmans):
-            include = False
-            for body_part in body_part_indexes:
-                if circle_includes(item,
-                                   body_part,
-                                   landmarks,
-                                   circle_radius,
-                                   body_part_indexes,
-                                   self.w_size,
-                                   body_part_required=False,
-                                   side_required=False):
-                    include = True
-                    break
 
-            item.color = (0, 255, 0) if include else (0, 0, 255)
-            item.earned_progress += include * self.p_speed
-            item.progress += (include or item.progress != 0) * self.p_speed
-
-            if self.max_packman_progress > item.progress > 0:
-                chance = randint(1, 10)
-                vector_priority = (self.vectors[item.last_vector],
-                                   self.vectors[item.last_vector - 1],
-                                   self.vectors[(item.last_vector + 1) % 4]) if chance <= 9 else \
-                                  (self.vectors[item.last_vector - 1],
-                                   self.vectors[(item.last_vector + 1) % 4])
-                for dx, dy in vector_priority:
-                    new_center = (item.center[0] + dx * self.p_speed, item.center[1] + dy * self.p_speed)
-                    valid_center = self.circle_in_area(new_center, circle_radius)
-                    if valid_center:
-                        item.center = new_center
-                        item.last_vector = self.vectors.index((dx, dy))
-                        break
-
-            if item.progress >= self.max_packman_progress:
-                accuracy = item.earned_progress / item.progress
-                if accuracy >= 0.8:
-                    score_bonus += 3
-                self.packmans.remove(item)
-
-        return score_bonus
-
-
-class MoovingCircleManager:
-    def __init__(self, w_size):
+class MoovingCircleManager(PathManager):
+    kind = Kind.MOOVING_CIRCLE
+    min_accuracy = 0.7
+
+    def __init__(self, w_size, entities, rng=random):
         # curve is slow but trajectory is more complex
-        self.w_size = w_size
-        self.c_speed = 4
-        self.ellipse_curves = []
+        super().__init__(w_size, entities, rng)
+        self.speed = 4
+        self.trajectories = config.gameplay.trajectories
+        self.max_path_length = config.gameplay.max_path_length
         self.ellipse_amax = w_size[1] / 8
         self.ellipse_bmax = w_size[0] / 8
 
     def add(self, circle_radius):
-        a = randint(self.ellipse_amax // 2, self.ellipse_amax)
-        b = randint(self.ellipse_amax // 2, self.ellipse_amax)
-        center = (randint(circle_radius + a * 2, self.w_size[1] - a * 2 - circle_radius),
-                  randint(circle_radius + b * 2, self.w_size[0] - b * 2 - circle_radius))
-        equation = lambda x: b * (1 - ((x - a) ** 2) / (a ** 2)) ** (1 / 2)
-        color = (0, 0, 255)
+        a = self.rng.randint(self.ellipse_amax // 2, self.ellipse_amax)
+        b = self.rng.randint(self.ellipse_bmax // 2, self.ellipse_bmax)
+        max_length = min(self.max_path_length, (MAX_PATH_POINTS - 1) * self.speed)
+        points = path(self.rng.choice(self.trajectories), a, b, self.speed, self.rng, max_length)
         # 1 - right 2 - left
-        vector = [1, -1][randint(0, 1)]
-
-        self.ellipse_curves.append(MoovingCircle(a, b, center, equation, color, vector))
-
-    def pop_out(self, landmarks, body_part_indexes, circle_radius):
-        score_bonus = 0
-        for index, item in enumerate(self.ellipse_curves):
-            include = False
-            for body_part in body_part_indexes:
-                if circle_includes(item,
-                                   body_part,
-                                   landmarks,
-                                   circle_radius,
-                                   body_part_indexes,
-                                   self.w_size,
-                                   body_part_required=False,
-                                   side_required=False):
-                    include = True
-                    break
-
-            dy = item.equation((item.progress + self.c_speed) % (2 * item.a)) - \
-                 item.equation(item.progress % (2 * item.a))
-
-            item.color = (0, 255, 0) if include else (0, 0, 255)
-            item.earned_progress += include * self.c_speed
-            item.progress += (include or item.progress != 0) * self.c_speed
-
-            if item.progress != 0:
-                item.center = (item.center[0] + item.vector * (self.c_speed * (-1 if item.progress >= item.a * 2 else 1)),
-                               item.center[1] + item.vector * (dy * (-1 if item.progress >= item.a * 2 else 1)))
-
-            if item.progress >= item.a * 4:
-                accuracy = item.earned_progress / item.progress
-                if accuracy >= 0.7:
-                    score_bonus += 3
-                self.ellipse_curves.remove(item)
+        points[:, 0] *= [1, -1][self.rng.randint(0, 1)]
+        # Box of the curve is placed inside the area
+        points += (self.rng.randint(circle_radius + a, self.w_size[1] - a - circle_radius),
+                   self.rng.randint(circle_radius + b, self.w_size[0] - b - circle_radius))
 
-        return score_bonus
+        self.entities.add(kind=self.kind, center=points[0], previous_center=points[0], color=Color.IDLE,
+                          mask=ANY_LIMB, length=(len(points) - 1) * self.speed, path=pad_path(points))
@@ -1,26 +1,139 @@
-class DefaultCircle:
-    def __init__(self, center, color, side):
-        self.center = center
-        self.color = color
-        self.side = side
-
-
-class Packman:
-    def __init__(self, center, color, last_vector):
-        self.center = center
-        self.color = color
-        self.last_vector = last_vector
-        self.progress = 0
-        self.earned_progress = 0
-
-
-class MoovingCircle:
-    def __init__(self, a, b, center, equation, color, vector):
-        self.a = a
-        self.b = b
-        self.center = center
-        self.equation = equation
-        self.color = color
-        self.vector = vector
-        self.progress = 0
-        self.earned_progress = 0
+"""
+Gameplay objects kept as a struct of arrays.
+
+Every attribute of the objects is a column of an EntityStore with a row per object, so that
+managers move and hit test all objects of a kind with array operations. A removed object is
+replaced by the last one, which keeps the rows packed in constant time per removal.
+"""
+from enum import IntEnum
+
+import numpy as np
+
+from config import config
+
+
+class Kind(IntEnum):
+    CIRCLE = 0
+    PACKMAN = 1
+    MOOVING_CIRCLE = 2
+
+
+class Color(IntEnum):
+    HAND = 0
+    FOOT = 1
+    IDLE = 2
+    ACTIVE = 3
+
+
+PALETTE = (config.graphics.hand_color, config.graphics.foot_color, (0, 0, 255), (0, 255, 0))
+# Side of the limb popping a circle, the empty side of other objects accepts any
+SIDES = ("", "L", "R")
+
+# Points of a path at most, see trajectories.path
+MAX_PATH_POINTS = 256
+
+# Column dtypes and row shapes
+FIELDS = {
+    "kind": (np.int8, ()),
+    "center": (np.float64, (2,)),
+    # Center before the last simulation step, drawing interpolates from it
+    "previous_center": (np.float64, (2,)),
+    # Pixels moved by the last step
+    "velocity": (np.float64, (2,)),
+    "color": (np.int8, ()),
+    "side": (np.int8, ()),
+    # Limbs able to pop the object, see hit_testing.target_mask
+    "mask": (np.int64, ()),
+    "progress": (np.float64, ()),
+    "earned_progress": (np.float64, ()),
+    # Progress completing the object
+    "length": (np.float64, ()),
+    # Points of moving objects at every step of their progress, padded with their last point
+    "path": (np.float32, (MAX_PATH_POINTS, 2)),
+}
+
+
+def pad_path(points):
+    """Path column value of points, longer paths are cut"""
+    padded = np.empty((MAX_PATH_POINTS, 2), np.float32)
+    points = points[:MAX_PATH_POINTS]
+    padded[:len(points)] = points
+    padded[len(points):] = points[-1]
+    return padded
+
+
+class Entity:
+    """View of an object in the store, valid until an object is removed from the store"""
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        object.__setattr__(self, "store", store)
+        object.__setattr__(self, "row", row)
+
+    def __getattr__(self, name):
+        try:
+            return self.store.columns[name][self.row]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self.store.columns[name][self.row] = value
+
+
+class EntityStore:
+    """
+    Objects of all kinds in columns of FIELDS, capacity grows by doubling.
+
+    Columns are available as attributes holding arrays of the live rows, e.g. store.center is
+    a (len(store), 2) array which updates the store when written to.
+    """
+
+    def __init__(self, capacity=16):
+        self.columns = {name: np.zeros((capacity,) + shape, dtype) for name, (dtype, shape) in FIELDS.items()}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, row):
+        if not 0 <= row < self.size:
+            raise IndexError(row)
+        return Entity(self, row)
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get("columns", {})
+        if name not in columns:
+            raise AttributeError(name)
+        return columns[name][:self.size]
+
+    @property
+    def capacity(self):
+        return len(self.columns["kind"])
+
+    def add(self, **values):
+        """Append an object, fields missing from values are zero. Returns its row"""
+        if self.size == self.capacity:
+            for name, column in self.columns.items():
+                grown = np.zeros((2 * len(column),) + column.shape[1:], column.dtype)
+                grown[:len(column)] = column
+                self.columns[name] = grown
+
+        row = self.size
+        for name, column in self.columns.items():
+            column[row] = values.pop(name, 0)
+        if values:
+            raise ValueError(f"Unknown fields: {', '.join(values)}")
+        self.size += 1
+        return row
+
+    def remove(self, rows):
+        """Remove objects at rows, moving the last objects into their place"""
+        for row in sorted(np.asarray(rows).tolist(), reverse=True):
+            last = self.size - 1
+            if row != last:
+                for column in self.columns.values():
+                    column[row] = column[last]
+            self.size = last
+
+    def rows(self, kind):
+        return np.flatnonzero(self.kind == kind)
@@ -1,71 +1,278 @@
+import collections
 import math
+import time
 from threading import Thread
 
-import cv2
 from openvino.inference_engine import IECore
 
+from pacing import InferenceCadence, MotionGate, ResolutionController
 from pose_utils import models
-from pose_utils.pipelines import get_user_config, AsyncPipeline
-from utils import log
+from pose_utils.pipelines import get_user_config, AsyncPipeline, NetworkCache
+from roi import PersonRoi
+from smoothing import create_filter, smooth_result
+from tracing import tracer
+from utils import PoseResult, Poses, log
 from config import config
 
 
 class OpenvinoInferenceThread(Thread):
-    def __init__(self, frame_deque, joints_deque, capture_shape):
+    def __init__(self, frames, joints_deque, capture_shape, result_event=None, input_rate=None, recorder=None):
         super().__init__()
         self._keep_running = False
 
-        self.frame_deque = frame_deque
+        self.frames = frames
         self.joints_deque = joints_deque
+        self.result_event = result_event
+        self.input_rate = input_rate
+        self.recorder = recorder
 
         # Initialize Inference Engine
         self.ie = IECore()
-        plugin_config = get_user_config(config.app.inference_device, '', None)
+        plugin_config = get_user_config(config.app.inference_device, config.inference.streams, config.inference.threads)
         self.model = config.app.model
+        self.network_cache = None
+        if config.inference.network_cache_dir:
+            self.network_cache = NetworkCache(self.ie, config.inference.network_cache_dir)
 
         # Prepare model parameters
-        net_input_width = config.app.neural_network_input_width
         cap_height, cap_width, _ = capture_shape
         aspect_ratio = cap_width / cap_height
-        if aspect_ratio >= 1:
-            target_size = math.floor(cap_height * net_input_width / cap_width)
+
+        # People are tracked in image coordinates, so all input sizes share the tracker
+        tracker = None
+        if config.tracking.enabled:
+            tracker = models.PoseTracker(
+                max_distance=config.tracking.max_distance * cap_width,
+                max_misses=config.tracking.max_misses,
+                stable_age=config.tracking.stable_age,
+            )
+
+        # Network loaded for every input width, so that switching between them costs nothing at runtime
+        if config.resolution.adaptive:
+            widths = config.resolution.widths
         else:
-            target_size = net_input_width
+            widths = (config.app.neural_network_input_width,)
+        self.pipelines = {}
+        for net_input_width in widths:
+            if aspect_ratio >= 1:
+                target_size = math.floor(cap_height * net_input_width / cap_width)
+            else:
+                target_size = net_input_width
+
+            model_embedding = models.create_model(
+                'HpeAssociativeEmbedding', self.ie, config.app.model_path, aspect_ratio=aspect_ratio,
+                target_size=target_size, prob_threshold=0.1, tracker=tracker,
+            )
 
-        model_embedding = models.HpeAssociativeEmbedding(
-            self.ie, config.app.model_path, aspect_ratio=aspect_ratio,
-            target_size=target_size, prob_threshold=0.1,
+            # Initialize pipeline
+            self.pipelines[net_input_width] = AsyncPipeline(
+                self.ie,
+                model_embedding,
+                plugin_config,
+                device=config.app.inference_device,
+                max_num_requests=config.inference.max_requests,
+                network_cache=self.network_cache,
+            )
+            log.info(f'Inference pipeline for input width {net_input_width} uses '
+                     f'{len(self.pipelines[net_input_width].exec_net.requests)} infer requests')
+
+        self.resolution = ResolutionController(
+            widths,
+            initial_size=config.app.neural_network_input_width,
+            budget=config.resolution.budget,
+            headroom=config.resolution.headroom,
+            min_dwell=config.resolution.min_dwell,
         )
+        log.info(f'Network input width is {self.resolution.size}')
+        if self.network_cache is not None:
+            self.network_cache.log_summary()
+        self.inferred = collections.Counter()
 
-        # Initialize pipeline
-        self.hpe_pipeline = AsyncPipeline(
-            self.ie,
-            model_embedding,
-            plugin_config,
-            device=config.app.inference_device,
-            max_num_requests=1,
+        # Sequence numbers of submitted frames in capture order along with their pipelines,
+        # used as a reorder buffer for results. Frames skipped by the motion gate have no pipeline
+        self.in_flight = collections.deque()
+        self.last_seq = -1
+        self.dropped_results = 0
+        self.cadence = InferenceCadence(
+            interval=config.cadence.interval,
+            adaptive=config.cadence.adaptive and input_rate is not None,
+            max_interval=config.cadence.max_interval,
+            budget=config.cadence.budget,
         )
-        self.net_input_size = (model_embedding.w, model_embedding.h)
+        self.joint_filter = create_filter(config.smoothing)
 
-    def process_last(self):
-        if not self.frame_deque:
-            log.warning('No frames to process; Input fps may be too low')
+        self.motion_gate = None
+        if config.motion_gate.enabled:
+            self.motion_gate = MotionGate(
+                still_threshold=config.motion_gate.still_threshold,
+                motion_threshold=config.motion_gate.motion_threshold,
+                max_skips=config.motion_gate.max_skips,
+                width=config.motion_gate.width,
+            )
+        self.last_result = None
+        # Capture info of skipped frames in flight by sequence number
+        self.skipped_frames = {}
+
+        self.roi = None
+        if config.roi.enabled:
+            self.roi = PersonRoi(
+                capture_shape,
+                padding=config.roi.padding,
+                min_size=config.roi.min_size,
+                max_size=config.roi.max_size,
+                max_people=config.roi.max_people,
+                score_threshold=config.app.detection_threshold,
+                full_frame_interval=config.roi.full_frame_interval,
+            )
+
+    @property
+    def hpe_pipeline(self):
+        """Pipeline of the current network input width"""
+        return self.pipelines[self.resolution.size]
+
+    def submit_last(self):
+        """Submit the latest captured frame once the cadence allows it"""
+        newer_than = self.cadence.next_seq(self.last_seq) - 1
+        slot = self.frames.acquire_latest(newer_than=newer_than, timeout=config.inference.idle_interval)
+        if slot is None:
+            return False
+        try:
+            info = slot.info
+            skip = False
+            if self.motion_gate is not None:
+                start = time.perf_counter()
+                skip = not self.motion_gate.should_infer(slot.frame)
+                tracer.record('motion_gate', start)
+            if not skip:
+                start = time.perf_counter()
+                roi = None
+                if self.roi is not None:
+                    # Postprocessing maps joints found in the region back to the full frame
+                    roi = self.roi.select(self.last_result.joints if self.last_result is not None else Poses.empty())
+                # The frame is resized straight into the input tensor of a free infer request
+                meta = {'frame': info, 'input_width': self.resolution.size}
+                pipeline = self.hpe_pipeline
+                pipeline.submit_data(slot.frame, info.seq, meta, roi=roi)
+        finally:
+            self.frames.release(slot)
+        self.last_seq = info.seq
+        if skip:
+            # Queued behind the results still in flight to keep the capture order
+            self.in_flight.append((info.seq, None))
+            self.skipped_frames[info.seq] = info
+            return True
+        meta['submit_time'] = tracer.record('submit', start)
+
+        self.in_flight.append((info.seq, pipeline))
+        return True
+
+    def reuse_last_result(self, info):
+        """Show the joints of the last result for a skipped frame, with their scores decayed"""
+        if self.last_result is None:
             return
-        frame = self.frame_deque[-1]
-        resized_frame = cv2.resize(frame, self.net_input_size, interpolation=cv2.INTER_AREA)
 
-        self.hpe_pipeline.submit_data(resized_frame, 0, {'frame': resized_frame, 'start_time': 0})
-        self.hpe_pipeline.await_any()
+        joints = self.last_result.joints.decay(config.motion_gate.confidence_decay)
+        self.last_result = PoseResult(info, joints, self.last_result.track_ids)
+        self.joints_deque.append(self.last_result)
+
+    def collect_results(self):
+        """Append completed results to joints deque in capture order"""
+        for pipeline in self.pipelines.values():
+            if pipeline.callback_exceptions:
+                raise pipeline.callback_exceptions[0]
 
-        results = self.hpe_pipeline.get_result(0)
+        ready = []
+        while self.in_flight:
+            seq, pipeline = self.in_flight[0]
+            if pipeline is not None and not pipeline.is_completed(seq):
+                break
+            ready.append(self.in_flight.popleft())
+
+        if config.inference.drop_stale_results and len(ready) > 1:
+            # Only the newest frame is going to be shown, skip postprocessing of the older ones
+            for seq, pipeline in ready[:-1]:
+                if pipeline is None:
+                    del self.skipped_frames[seq]
+                else:
+                    pipeline.get_raw_result(seq)
+                    self.dropped_results += 1
+            ready = ready[-1:]
+
+        for seq, pipeline in ready:
+            if pipeline is None:
+                self.reuse_last_result(self.skipped_frames.pop(seq))
+                continue
+            start = time.perf_counter()
+            results = pipeline.get_result(seq)
+            postprocess_end = tracer.record('postprocess', start)
+            joints = self.model.get_joints_from_result(results)
+            track_ids = self.model.get_track_ids_from_result(results)
+            tracer.record('joints', postprocess_end)
+
+            _, meta = results
+            tracer.record('infer', meta['submit_time'], meta['completion_time'])
+            tracer.record(f'infer_{meta["input_width"]}', meta['submit_time'], meta['completion_time'])
+            tracer.record('reorder', meta['completion_time'], start)
+            self.inferred[meta['input_width']] += 1
+            if self.input_rate is not None:
+                latency = meta['completion_time'] - meta['submit_time']
+                self.cadence.update(latency, self.input_rate.rate)
+                self.update_resolution(meta['input_width'], latency)
+
+            result = PoseResult(meta['frame'], joints, track_ids)
+            if self.recorder is not None:
+                self.recorder.append(result)
+            if self.joint_filter is not None:
+                smoothing_start = time.perf_counter()
+                result = smooth_result(self.joint_filter, result)
+                tracer.record('smoothing', smoothing_start)
+            self.joints_deque.append(result)
+            self.last_result = result
+
+        if ready and self.result_event is not None:
+            self.result_event.set()
+        return len(ready)
+
+    def update_resolution(self, input_width, latency):
+        if len(self.pipelines) == 1:
+            return
+        period = self.cadence.interval / self.input_rate.rate
+        previous = self.resolution.update(input_width, latency, period)
+        if previous is not None:
+            log.info(f'Switched network input width {previous} -> {self.resolution.size} '
+                     f'at {self.resolution.latency[self.resolution.sizes.index(previous)] * 1000:.1f} ms '
+                     f'inference latency and {period * 1000:.1f} ms between inferred frames')
+
+    def process_last(self):
+        # Collected first, so that requests are free again before their outputs are overwritten
+        collected = self.collect_results()
+        submitted = self.hpe_pipeline.is_ready() and self.submit_last()
+        if submitted or collected:
+            return
 
-        joints = self.model.get_joints_from_result(results)
-        self.joints_deque.append(joints)
+        if self.in_flight and not self.hpe_pipeline.is_ready():
+            # Requests are freed in capture order, the oldest one in flight is the one to wait for
+            seq, pipeline = self.in_flight[0]
+            pipeline.await_request(seq)
 
     def run(self):
         self._keep_running = True
         while self._keep_running:
             self.process_last()
+        for pipeline in self.pipelines.values():
+            pipeline.await_all()
+        if len(self.pipelines) > 1:
+            log.info(f'Switched network input width {self.resolution.switches} times, frames inferred per width: '
+                     f'{dict(sorted(self.inferred.items()))}')
+        if self.dropped_results:
+            log.debug(f'Dropped {self.dropped_results} stale inference results')
+        if self.cadence.adaptive:
+            log.debug(f'Inference cadence settled at every {self.cadence.interval} frames')
+        if self.roi is not None:
+            log.info(f'Inference ran on a player region of {self.roi.cropped_share:.1%} of {self.roi.selected} frames')
+        if self.motion_gate is not None:
+            log.info(f'Motion gate skipped inference on {self.motion_gate.skipped_share:.1%} '
+                     f'of {self.motion_gate.checked} frames')
 
     def stop(self):
         self._keep_running = False
@@ -0,0 +1,273 @@
+import math
+import time
+
+import cv2
+import numpy as np
+
+
+class RateEstimator:
+    """Event rate estimated from an exponentially weighted moving average of intervals between events"""
+
+    def __init__(self, initial_rate, smoothing=0.1):
+        self.interval = 1 / initial_rate
+        self.smoothing = smoothing
+        self.last_seq = None
+        self.last_timestamp = None
+        self.subscribers = []
+
+    @property
+    def rate(self):
+        return 1 / self.interval
+
+    def update(self, seq, timestamp):
+        """Account for event number seq happening at timestamp; skipped events are allowed"""
+        if self.last_seq is not None and seq > self.last_seq and timestamp > self.last_timestamp:
+            interval = (timestamp - self.last_timestamp) / (seq - self.last_seq)
+            self.interval += self.smoothing * (interval - self.interval)
+            for callback in self.subscribers:
+                callback(self.rate)
+        self.last_seq = seq
+        self.last_timestamp = timestamp
+
+    def subscribe(self, callback):
+        """Call callback(rate) on every update of the estimate; it runs on the updating thread"""
+        self.subscribers.append(callback)
+
+
+class InferenceCadence:
+    """
+    Choice of the captured frames inference runs on.
+
+    Inference runs on every interval-th frame. In adaptive mode the interval is the smallest
+    one keeping the smoothed inference latency within the budget share of the time between
+    inferred frames.
+    """
+
+    def __init__(self, interval=1, adaptive=False, max_interval=4, budget=0.5, smoothing=0.1):
+        self.interval = interval
+        self.adaptive = adaptive
+        self.max_interval = max_interval
+        self.budget = budget
+        self.smoothing = smoothing
+        self.latency = None
+
+    def next_seq(self, last_seq):
+        """Sequence number of the next frame to run inference on"""
+        return last_seq + self.interval
+
+    def update(self, latency, frame_rate):
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.smoothing * (latency - self.latency)
+        if self.adaptive:
+            interval = math.ceil(self.latency * frame_rate / self.budget)
+            self.interval = min(max(interval, 1), self.max_interval)
+
+
+class MotionGate:
+    """
+    Decision to skip inference on frames showing no motion.
+
+    Frames are shrunk to a small gray thumbnail and compared with the thumbnail of the last
+    inferred frame. The scene turns still once their mean absolute difference drops below
+    still_threshold and moving again once it exceeds motion_threshold. Still frames are skipped,
+    but no more than max_skips in a row.
+    """
+
+    def __init__(self, still_threshold=0.001, motion_threshold=0.002, max_skips=15, width=64):
+        self.still_threshold = still_threshold
+        self.motion_threshold = motion_threshold
+        self.max_skips = max_skips
+        self.width = width
+        self.reference = None
+        self.still = False
+        self.skips = 0
+        self.checked = 0
+        self.skipped = 0
+
+    @property
+    def skipped_share(self):
+        return self.skipped / self.checked if self.checked else 0.0
+
+    def thumbnail(self, frame):
+        height = max(round(frame.shape[0] * self.width / frame.shape[1]), 1)
+        # Area resize averages out sensor noise, skipping pixels would keep it
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = small.mean(axis=2)
+        return small.astype(np.float32) / 255
+
+    def motion(self, thumbnail):
+        return float(np.mean(np.abs(thumbnail - self.reference)))
+
+    def should_infer(self, frame):
+        """Whether inference should run on frame, which then becomes the reference of later frames"""
+        self.checked += 1
+        thumbnail = self.thumbnail(frame)
+        if self.reference is not None:
+            motion = self.motion(thumbnail)
+            if self.still and motion > self.motion_threshold:
+                self.still = False
+            elif not self.still and motion < self.still_threshold:
+                self.still = True
+            if self.still and self.skips < self.max_skips:
+                self.skips += 1
+                self.skipped += 1
+                return False
+
+        self.reference = thumbnail
+        self.skips = 0
+        return True
+
+
+class ResolutionController:
+    """
+    Choice of the network input size from the measured inference latency.
+
+    Latency is smoothed for every size separately. The controller steps down to the next smaller
+    size once the latency exceeds the budget share of the time between inferred frames and steps
+    up once the latency expected at the next larger size, scaled by its number of pixels, fits in
+    the headroom share of the budget. A size is kept for at least min_dwell seconds after a switch.
+    """
+
+    def __init__(self, sizes, initial_size=None, budget=0.8, headroom=0.7, min_dwell=2.0, smoothing=0.1):
+        self.sizes = sorted(sizes)
+        self.index = self.sizes.index(initial_size) if initial_size in self.sizes else len(self.sizes) // 2
+        self.budget = budget
+        self.headroom = headroom
+        self.min_dwell = min_dwell
+        self.smoothing = smoothing
+        self.latency = [None] * len(self.sizes)
+        self.last_switch = time.perf_counter()
+        self.switches = 0
+
+    @property
+    def size(self):
+        return self.sizes[self.index]
+
+    def update(self, size, latency, period, now=None):
+        """
+        Account for the latency of an inference at the given size, period being the time between
+        inferred frames. Returns the previous size if the controller switched, otherwise None.
+        """
+        index = self.sizes.index(size)
+        if self.latency[index] is None:
+            self.latency[index] = latency
+        else:
+            self.latency[index] += self.smoothing * (latency - self.latency[index])
+
+        now = time.perf_counter() if now is None else now
+        # Results of the requests submitted before the last switch do not tell about the current size
+        if index != self.index or now - self.last_switch < self.min_dwell:
+            return None
+
+        current = self.latency[index]
+        target = self.index
+        if current > self.budget * period and self.index > 0:
+            target = self.index - 1
+        elif self.index + 1 < len(self.sizes):
+            # Latency measured at the larger size may be outdated, the current one is scaled instead
+            expected = current * (self.sizes[self.index + 1] / self.size) ** 2
+            if expected < self.headroom * self.budget * period:
+                target = self.index + 1
+        if target == self.index:
+            return None
+
+        previous = self.size
+        self.index = target
+        self.last_switch = now
+        self.switches += 1
+        return previous
+
+
+class FixedTimestep:
+    """
+    Accumulator turning elapsed time into steps of a fixed length.
+
+    `advance(now)` returns the number of steps of 1 / rate seconds due since the previous call,
+    `alpha` is the share of a step left over, for rendering in between the last two steps.
+    At most max_steps are returned at once, the rest of a long stall is dropped instead of
+    being caught up with ever slower frames.
+    """
+
+    def __init__(self, rate, max_steps=5):
+        self.dt = 1 / rate
+        self.max_steps = max_steps
+        self.last = None
+        self.accumulator = 0.0
+        self.steps = 0
+        self.dropped = 0
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.dt
+
+    def advance(self, now):
+        if self.last is not None:
+            self.accumulator += now - self.last
+        self.last = now
+
+        steps = int(self.accumulator // self.dt)
+        self.accumulator -= steps * self.dt
+        if steps > self.max_steps:
+            self.dropped += steps - self.max_steps
+            steps = self.max_steps
+        self.steps += steps
+        return steps
+
+    def skip(self, now):
+        """Let the time up to now pass without steps, e.g. while paused"""
+        self.last = now
+
+
+class FrameScheduler:
+    """
+    Deadline based pacing of a render loop.
+
+    Deadlines follow each other at the target period. `wait()` sleeps until the next
+    deadline but returns early when the wake event is set, after which the cadence is
+    re-aligned to the early frame. A frame finishing after the following deadline
+    counts as a missed deadline.
+    """
+
+    def __init__(self, fps, wake_event=None):
+        self.period = 1 / fps
+        self.wake_event = wake_event
+        self.deadline = None
+        self.frame_start = None
+        self.frames = 0
+        self.missed_deadlines = 0
+
+    def set_rate(self, fps):
+        self.period = 1 / fps
+
+    def wait(self):
+        now = time.perf_counter()
+        if self.deadline is None:
+            self.deadline = now
+
+        timeout = self.deadline - now
+        woken = False
+        if timeout > 0:
+            if self.wake_event is not None:
+                woken = self.wake_event.wait(timeout)
+            else:
+                time.sleep(timeout)
+        if self.wake_event is not None:
+            self.wake_event.clear()
+
+        self.frame_start = time.perf_counter()
+        if woken:
+            self.deadline = self.frame_start
+        return woken
+
+    def frame_done(self):
+        """Schedule the deadline after the frame that has just been rendered"""
+        now = time.perf_counter()
+        self.frames += 1
+        self.deadline += self.period
+        if now > self.deadline:
+            # Rendering overran the period, skip the deadlines that have passed instead of catching up
+            self.missed_deadlines += 1
+            self.deadline += math.ceil((now - self.deadline) / self.period) * self.period
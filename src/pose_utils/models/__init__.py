@@ -15,20 +15,52 @@
 """
 
 
-from .centernet import CenterNet
-from .deblurring import Deblurring
-from .ctpn import CTPN
-from .faceboxes import FaceBoxes
-from .hpe_associative_embedding import HpeAssociativeEmbedding
-from .open_pose import OpenPose
-from .retinaface import RetinaFace, RetinaFacePyTorch
-from .segmentation import SegmentationModel, SalientObjectDetectionModel
-from .ssd import SSD
-from .ultra_lightweight_face_detection import UltraLightweightFaceDetection
-from .utils import DetectionWithLandmarks, InputTransform, OutputTransform
-from .yolo import YOLO, YoloV4
+import importlib
+
+# Models are imported on first use, so that only the ones an application uses are paid for
+_MODULES = {
+    'CenterNet': '.centernet',
+    'CTPN': '.ctpn',
+    'DetectionWithLandmarks': '.utils',
+    'Deblurring': '.deblurring',
+    'FaceBoxes': '.faceboxes',
+    'HpeAssociativeEmbedding': '.hpe_associative_embedding',
+    'InputTransform': '.utils',
+    'OpenPose': '.open_pose',
+    'OutputTransform': '.utils',
+    'PoseTracker': '.hpe_associative_embedding',
+    'RetinaFace': '.retinaface',
+    'RetinaFacePyTorch': '.retinaface',
+    'SalientObjectDetectionModel': '.segmentation',
+    'SegmentationModel': '.segmentation',
+    'SSD': '.ssd',
+    'UltraLightweightFaceDetection': '.ultra_lightweight_face_detection',
+    'YOLO': '.yolo',
+    'YoloV4': '.yolo',
+}
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module(_MODULES[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES))
+
+
+def create_model(name, *args, **kwargs):
+    """Create a model by its class name, importing only the module it is defined in"""
+    if name not in _MODULES:
+        raise ValueError('Unknown model {}, available ones are {}'.format(name, ', '.join(sorted(_MODULES))))
+    return __getattr__(name)(*args, **kwargs)
+
 
 __all__ = [
+    'create_model',
     'CenterNet',
     'CTPN',
     'DetectionWithLandmarks',
@@ -38,6 +70,7 @@ __all__ = [
     'InputTransform',
     'OpenPose',
     'OutputTransform',
+    'PoseTracker',
     'RetinaFace',
     'RetinaFacePyTorch',
     'SalientObjectDetectionModel',
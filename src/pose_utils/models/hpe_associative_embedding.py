@@ -14,15 +14,18 @@
  limitations under the License.
 """
 
+from typing import NamedTuple
+
 import numpy as np
 from scipy.optimize import linear_sum_assignment
 
 from .model import Model
-from .utils import resize_image
+from .utils import PaddedResize
 
 
 class HpeAssociativeEmbedding(Model):
-    def __init__(self, ie, model_path, target_size, aspect_ratio, prob_threshold, delta=0.0, size_divisor=32, padding_mode='right_bottom'):
+    def __init__(self, ie, model_path, target_size, aspect_ratio, prob_threshold, delta=0.0, size_divisor=32, padding_mode='right_bottom',
+                 tracker=None):
         super().__init__(ie, model_path)
         self.image_blob_name = self._get_inputs(self.net)
         self.heatmaps_blob_name = find_layer_by_name('heatmaps', self.net.outputs)
@@ -48,6 +51,8 @@ class HpeAssociativeEmbedding(Model):
         input_shape = {self.image_blob_name: (default_input_shape[:-2] + [self.h, self.w])}
         self.logger.info('Reshape net to {}'.format(input_shape))
         self.net.reshape(input_shape)
+        # Images are resized straight into U8 input tensors, the plugin converts them to its precision
+        self.net.input_info[self.image_blob_name].precision = 'U8'
 
         self.decoder = AssociativeEmbeddingDecoder(
             num_joints=self.net.outputs[self.heatmaps_blob_name].shape[1],
@@ -63,6 +68,8 @@ class HpeAssociativeEmbedding(Model):
             dist_reweight=True)
         self.size_divisor = size_divisor
         self.padding_mode = padding_mode
+        self.resize = PaddedResize((self.w, self.h), padding_mode=padding_mode)
+        self.tracker = tracker
 
     @staticmethod
     def _get_inputs(net):
@@ -78,39 +85,58 @@ class HpeAssociativeEmbedding(Model):
         return image_blob_name
 
     def preprocess(self, inputs):
-        img = resize_image(inputs, (self.w, self.h), keep_aspect_ratio=True)
-        h, w = img.shape[:2]
+        tensor = np.zeros((1, inputs.shape[2], self.h, self.w), inputs.dtype)
+        meta = self.preprocess_into(inputs, {self.image_blob_name: tensor})
+        return {self.image_blob_name: tensor}, meta
+
+    def preprocess_into(self, inputs, buffers, roi=None):
+        # Only the region of interest (x0, y0, x1, y1) of the image is inferred if given
+        offset = np.zeros(2, np.float32)
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            inputs = inputs[y0:y1, x0:x1]
+            offset[:] = x0, y0
+        # Single resize of the original image into the padded NCHW tensor
+        w, h = self.resize(inputs, buffers[self.image_blob_name])
         if not (self.h - self.size_divisor < h <= self.h and self.w - self.size_divisor < w <= self.w):
             self.logger.warn("Chosen model aspect ratio doesn't match image aspect ratio")
         resize_img_scale = np.array((inputs.shape[1] / w, inputs.shape[0] / h), np.float32)
-
-        if self.padding_mode == 'center':
-            pad = ((self.h - h + 1) // 2, (self.h - h) // 2, (self.w - w + 1) // 2, (self.w - w) // 2)
-        else:
-            pad = (0, self.h - h, 0, self.w - w)
-        img = np.pad(img, (pad[:2], pad[2:], (0, 0)), mode='constant', constant_values=0)
-        img = img.transpose((2, 0, 1))  # Change data layout from HWC to CHW
-        img = img[None]
-        meta = {
+        return {
             'original_size': inputs.shape[:2],
-            'resize_img_scale': resize_img_scale
+            'resize_img_scale': resize_img_scale,
+            'offset': offset,
         }
-        return {self.image_blob_name: img}, meta
+
+    def _get_image_transform(self, meta):
+        """Scale and shift mapping heatmap coordinates to the original image"""
+        if self.padding_mode == 'center':
+            scale = meta['resize_img_scale'][self.index_of_max_dimension]
+            shift = np.zeros(2, np.float32)
+            shift[1 - self.index_of_max_dimension] = \
+                (meta['original_size'][self.index_of_max_dimension] - max(self.h, self.w) * scale) / 2
+            return scale * self.output_scale, shift + meta['offset']
+        return meta['resize_img_scale'] * self.output_scale, meta['offset']
 
     def postprocess(self, outputs, meta):
         heatmaps = outputs[self.heatmaps_blob_name]
         nms_heatmaps = outputs[self.nms_heatmaps_blob_name]
         aembds = outputs[self.embeddings_blob_name]
-        poses, scores = self.decoder(heatmaps, aembds, nms_heatmaps=nms_heatmaps)
+        scale, shift = self._get_image_transform(meta)
+
+        prior = None
+        if self.tracker is not None:
+            prior = self.tracker.get_prior(lambda points: (points - shift) / scale)
+        poses, scores, tags, seeds = self.decoder.decode(heatmaps, aembds, nms_heatmaps, prior)
+
         # Rescale poses to the original image.
-        if self.padding_mode == 'center':
-            scale = meta['resize_img_scale'][self.index_of_max_dimension]
-            poses[:, :, :2] *= scale * self.output_scale
-            shift = (meta['original_size'][self.index_of_max_dimension] - max(self.h, self.w) * scale) / 2
-            poses[:, :, 1 - self.index_of_max_dimension] += shift
+        poses[:, :, :2] *= scale
+        poses[:, :, :2] += shift
+
+        if self.tracker is not None:
+            track_ids = self.tracker.update(poses, tags, seeds)
         else:
-            poses[:, :, :2] *= meta['resize_img_scale'] * self.output_scale
-        return poses, scores
+            track_ids = np.arange(len(poses))
+        return poses, scores, track_ids
 
 
 def find_layer_by_name(name, layers):
@@ -124,42 +150,115 @@ def find_layer_by_name(name, layers):
     return suitable_layers[0]
 
 
-class Pose:
-    def __init__(self, num_joints, tag_size=1):
-        self.num_joints = num_joints
-        self.tag_size = tag_size
-        # 2 is for x, y and 1 is for joint confidence
-        self.pose = np.zeros((num_joints, 2 + 1 + tag_size), dtype=np.float32)
-        self.pose_tag = np.zeros(tag_size, dtype=np.float32)
-        self.valid_points_num = 0
-        self.c = np.zeros(2, dtype=np.float32)
-
-    def add(self, idx, joint, tag):
-        self.pose[idx] = joint
-        self.c = self.c * self.valid_points_num + joint[:2]
-        self.pose_tag = (self.pose_tag * self.valid_points_num) + tag
-        self.valid_points_num += 1
-        self.c /= self.valid_points_num
-        self.pose_tag /= self.valid_points_num
-
-    @property
-    def tag(self):
-        if self.valid_points_num > 0:
-            return self.pose_tag
-        return None
-
-    @property
-    def center(self):
-        if self.valid_points_num > 0:
-            return self.c
-        return None
+class PosePrior(NamedTuple):
+    """Tracked poses of the previous frame in heatmap coordinates"""
+    tags: np.ndarray
+    centers: np.ndarray
+    joints: np.ndarray
+    stable: np.ndarray
+
+
+class PoseTracker:
+    """
+    Keeps identities of people across frames.
+
+    Tracked poses seed the decoder of the next frame and the poses continuing them keep
+    their track id. Remaining poses are matched to the remaining tracks by the distance
+    between pose centers in the original image and start new tracks otherwise.
+    """
+
+    def __init__(self, max_distance, max_misses=5, stable_age=3):
+        self.max_distance = max_distance
+        self.max_misses = max_misses
+        self.stable_age = stable_age
+
+        self.ids = np.zeros(0, np.int64)
+        self.tags = None
+        self.joints = None
+        # Number of consecutive frames each track was found and missed in
+        self.ages = np.zeros(0, np.int64)
+        self.misses = np.zeros(0, np.int64)
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def get_centers(joints):
+        visible = joints[..., 2] > 0
+        counts = np.maximum(visible.sum(axis=1), 1)
+        return (joints[..., :2] * visible[..., None]).sum(axis=1) / counts[:, None]
+
+    def get_prior(self, to_heatmap):
+        """Tracks as decoder seeds, to_heatmap converts original image coordinates to heatmap ones"""
+        if not len(self):
+            return None
+        joints = self.joints.copy()
+        joints[..., :2] = to_heatmap(joints[..., :2])
+        stable = (self.ages >= self.stable_age) & (self.misses == 0)
+        return PosePrior(self.tags, self.get_centers(joints), joints, stable)
+
+    def update(self, poses, tags, seeds):
+        """Assign track ids to the poses of a new frame, seeds are indexes of the tracks they continue"""
+        if self.joints is None:
+            self.joints = np.zeros((0, *poses.shape[1:2], 3), poses.dtype)
+            self.tags = np.zeros((0, *tags.shape[1:]), tags.dtype)
+        track_of_pose = np.full(len(poses), -1)
+        centers = self.get_centers(poses)
+        if len(self):
+            track_centers = self.get_centers(self.joints)
+            continued = seeds >= 0
+            continued[continued] = np.linalg.norm(centers[continued] - track_centers[seeds[continued]], axis=1) \
+                <= self.max_distance
+            track_of_pose[continued] = seeds[continued]
+
+            free_poses = np.nonzero(track_of_pose < 0)[0]
+            free_tracks = np.setdiff1d(np.arange(len(self)), track_of_pose[continued])
+            if len(free_poses) and len(free_tracks):
+                dists = np.linalg.norm(centers[free_poses, None] - track_centers[None, free_tracks], axis=2)
+                rows, cols = linear_sum_assignment(dists)
+                close = dists[rows, cols] <= self.max_distance
+                track_of_pose[free_poses[rows[close]]] = free_tracks[cols[close]]
+
+        found = track_of_pose[track_of_pose >= 0]
+        missed = np.ones(len(self), bool)
+        missed[found] = False
+        self.joints[found] = poses[track_of_pose >= 0, :, :3]
+        self.tags[found] = tags[track_of_pose >= 0]
+        self.ages[found] += 1
+        self.misses[found] = 0
+        self.ages[missed] = 0
+        self.misses[missed] += 1
+
+        # New tracks for poses not continuing any
+        new_poses = track_of_pose < 0
+        num_new = int(new_poses.sum())
+        track_of_pose[new_poses] = np.arange(len(self), len(self) + num_new)
+        new_ids = np.arange(self.next_id, self.next_id + num_new)
+        self.next_id += num_new
+        self.ids = np.concatenate((self.ids, new_ids))
+        self.joints = np.concatenate((self.joints, poses[new_poses, :, :3]))
+        self.tags = np.concatenate((self.tags, tags[new_poses]))
+        self.ages = np.concatenate((self.ages, np.ones(num_new, np.int64)))
+        self.misses = np.concatenate((self.misses, np.zeros(num_new, np.int64)))
+        track_ids = self.ids[track_of_pose]
+
+        # Forget tracks missed for too long
+        kept = self.misses <= self.max_misses
+        if not kept.all():
+            self.ids = self.ids[kept]
+            self.joints = self.joints[kept]
+            self.tags = self.tags[kept]
+            self.ages = self.ages[kept]
+            self.misses = self.misses[kept]
+        return track_ids
 
 
 class AssociativeEmbeddingDecoder:
     def __init__(self, num_joints, max_num_people, detection_threshold, use_detection_val,
                  ignore_too_much, tag_threshold, pose_threshold,
                  adjust=True, refine=True, delta=0.0, joints_order=None,
-                 dist_reweight=True):
+                 dist_reweight=True, refine_window=2):
         self.num_joints = num_joints
         self.max_num_people = max_num_people
         self.detection_threshold = detection_threshold
@@ -177,18 +276,56 @@ class AssociativeEmbeddingDecoder:
         self.do_refine = refine
         self.dist_reweight = dist_reweight
         self.delta = delta
+        # Half size of the window stable joints of tracked poses are looked up in
+        self.refine_window = refine_window
+
+        self.pose_joints = None
+        self.pose_tags = None
+        self.pose_centers = None
+        self.pose_counts = None
 
     @staticmethod
     def _max_match(scores):
         r, c = linear_sum_assignment(scores)
         return np.stack((r, c), axis=1)
 
-    def _match_by_tag(self, inp):
+    def _reset_pose_store(self, max_candidates, embd_size, num_seeds=0):
+        """Preallocated struct of arrays for poses being grouped, reused across calls"""
+        capacity = self.num_joints * max_candidates + num_seeds
+        if self.pose_joints is None or self.pose_joints.shape[0] < capacity \
+                or self.pose_tags.shape[1] != embd_size:
+            # 2 is for x, y and 1 is for joint confidence
+            self.pose_joints = np.zeros((capacity, self.num_joints, 2 + 1 + embd_size), dtype=np.float32)
+            # Running means of tags and positions of the joints added to each pose
+            self.pose_tags = np.zeros((capacity, embd_size), dtype=np.float32)
+            self.pose_centers = np.zeros((capacity, 2), dtype=np.float64)
+            self.pose_counts = np.zeros(capacity, dtype=np.float32)
+        else:
+            self.pose_joints.fill(0)
+            self.pose_tags.fill(0)
+            self.pose_centers.fill(0)
+            self.pose_counts.fill(0)
+
+    def _add_to_poses(self, pose_idx, joint_idx, joints, tags):
+        counts = self.pose_counts[pose_idx][:, None]
+        self.pose_joints[pose_idx, joint_idx] = joints
+        self.pose_centers[pose_idx] = (self.pose_centers[pose_idx] * counts + joints[:, :2]) / (counts + 1)
+        self.pose_tags[pose_idx] = (self.pose_tags[pose_idx] * counts + tags) / (counts + 1)
+        self.pose_counts[pose_idx] += 1
+
+    def _match_by_tag(self, inp, prior=None):
         tag_k, loc_k, val_k = inp
         embd_size = tag_k.shape[2]
         all_joints = np.concatenate((loc_k, val_k[..., None], tag_k), -1)
 
-        poses = []
+        num_seeds = 0 if prior is None else len(prior.tags)
+        self._reset_pose_store(tag_k.shape[1], embd_size, num_seeds)
+        if num_seeds:
+            # Poses of the previous frame take part in matching from the first joint type on,
+            # their tag and center get replaced by the ones of the first joint added
+            self.pose_tags[:num_seeds] = prior.tags
+            self.pose_centers[:num_seeds] = prior.centers
+        num_poses = num_seeds
         for idx in self.joint_order:
             tags = tag_k[idx]
             joints = all_joints[idx]
@@ -196,24 +333,22 @@ class AssociativeEmbeddingDecoder:
             tags = tags[mask]
             joints = joints[mask]
 
-            if len(poses) == 0:
-                for tag, joint in zip(tags, joints):
-                    pose = Pose(self.num_joints, embd_size)
-                    pose.add(idx, joint, tag)
-                    poses.append(pose)
+            if num_poses == 0:
+                num_poses = joints.shape[0]
+                self._add_to_poses(np.arange(num_poses), idx, joints, tags)
                 continue
 
-            if joints.shape[0] == 0 or (self.ignore_too_much and len(poses) == self.max_num_people):
+            if joints.shape[0] == 0 or (self.ignore_too_much and num_poses == self.max_num_people):
                 continue
 
-            poses_tags = np.stack([p.tag for p in poses], axis=0)
+            poses_tags = self.pose_tags[:num_poses]
             diff = tags[:, None] - poses_tags[None, :]
             diff_normed = np.linalg.norm(diff, ord=2, axis=2)
             diff_saved = np.copy(diff_normed)
 
             if self.dist_reweight:
                 # Reweight cost matrix to prefer nearby points among all that are close enough in a tag space.
-                centers = np.stack([p.center for p in poses], axis=0)[None]
+                centers = self.pose_centers[:num_poses][None]
                 dists = np.linalg.norm(joints[:, :2][:, None, :] - centers, ord=2, axis=2)
                 close_tags_masks = diff_normed < self.tag_threshold
                 min_dists = np.min(dists, axis=0, keepdims=True)
@@ -228,18 +363,27 @@ class AssociativeEmbeddingDecoder:
                 diff_normed = np.pad(diff_normed, ((0, 0), (0, num_added - num_grouped)),
                                      mode='constant', constant_values=1e10)
 
-            pairs = self._max_match(diff_normed)
-            for row, col in pairs:
-                if row < num_added and col < num_grouped and diff_saved[row][col] < self.tag_threshold:
-                    poses[col].add(idx, joints[row], tags[row])
-                else:
-                    pose = Pose(self.num_joints, embd_size)
-                    pose.add(idx, joints[row], tags[row])
-                    poses.append(pose)
-
-        ans = np.asarray([p.pose for p in poses], dtype=np.float32).reshape(-1, self.num_joints, 2 + 1 + embd_size)
-        tags = np.asarray([p.tag for p in poses], dtype=np.float32).reshape(-1, embd_size)
-        return ans, tags
+            rows, cols = self._max_match(diff_normed).T
+            grouped = cols < num_grouped
+            grouped[grouped] = diff_saved[rows[grouped], cols[grouped]] < self.tag_threshold
+            self._add_to_poses(cols[grouped], idx, joints[rows[grouped]], tags[rows[grouped]])
+
+            # Joints not close enough to any pose start new ones
+            new_rows = rows[~grouped]
+            new_poses = np.arange(num_poses, num_poses + len(new_rows))
+            self._add_to_poses(new_poses, idx, joints[new_rows], tags[new_rows])
+            num_poses += len(new_rows)
+
+        if num_seeds:
+            # Seeds that got no joints in this frame are dropped
+            kept = np.nonzero(self.pose_counts[:num_poses] > 0)[0]
+            seeds = np.where(kept < num_seeds, kept, -1)
+        else:
+            kept = slice(0, num_poses)
+            seeds = np.full(num_poses, -1)
+        ans = self.pose_joints[kept].copy()
+        tags = self.pose_tags[kept].copy()
+        return ans, tags, seeds
 
     def top_k(self, heatmaps, tags):
         N, K, H, W = heatmaps.shape
@@ -260,64 +404,124 @@ class AssociativeEmbeddingDecoder:
         return tag_k, loc_k, val_k
 
     @staticmethod
-    def adjust(ans, heatmaps):
+    def _shift_to_higher_neighbour(heatmaps, joints_idx, x, y):
+        """Quarter pixel shifts towards the higher neighbouring heatmap values, zero at the heatmap border"""
         H, W = heatmaps.shape[-2:]
+        inside = (1 < x) & (x < W - 1) & (1 < y) & (y < H - 1)
+        x = np.clip(x, 1, W - 2)
+        y = np.clip(y, 1, H - 2)
+        dx = heatmaps[joints_idx, y, x + 1] - heatmaps[joints_idx, y, x - 1]
+        dy = heatmaps[joints_idx, y + 1, x] - heatmaps[joints_idx, y - 1, x]
+        shift = np.sign(np.stack((dx, dy), axis=-1)) * .25
+        return np.where(inside[..., None], shift, 0)
+
+    @classmethod
+    def adjust(cls, ans, heatmaps):
         for batch_idx, people in enumerate(ans):
-            for person in people:
-                for k, joint in enumerate(person):
-                    heatmap = heatmaps[batch_idx, k]
-                    px = int(joint[0])
-                    py = int(joint[1])
-                    if 1 < px < W - 1 and 1 < py < H - 1:
-                        diff = np.array([
-                            heatmap[py, px + 1] - heatmap[py, px - 1],
-                            heatmap[py + 1, px] - heatmap[py - 1, px]
-                        ])
-                        joint[:2] += np.sign(diff) * .25
+            joints_idx = np.arange(people.shape[1])[None]
+            x = people[..., 0].astype(int)
+            y = people[..., 1].astype(int)
+            people[..., :2] += cls._shift_to_higher_neighbour(heatmaps[batch_idx], joints_idx, x, y)
         return ans
 
-    @staticmethod
-    def refine(heatmap, tag, keypoints, pose_tag=None):
+    @classmethod
+    def refine(cls, heatmap, tag, poses, pose_tags=None, prior_joints=None, window=2):
+        """
+        Look for the missing joints of all poses at positions with the closest tag value to the pose tag.
+
+        Joints with a known position in prior_joints are instead looked up at the heatmap maximum
+        in a small window around that position.
+        """
         K, H, W = heatmap.shape
         if len(tag.shape) == 3:
             tag = tag[..., None]
 
-        if pose_tag is not None:
-            prev_tag = pose_tag
+        if pose_tags is None:
+            present = poses[..., 2] > 0
+            x = np.clip(poses[..., 0].astype(int), 0, W - 1)
+            y = np.clip(poses[..., 1].astype(int), 0, H - 1)
+            joints_tags = tag[np.arange(K)[None], y, x] * present[..., None]
+            pose_tags = joints_tags.sum(axis=1) / present.sum(axis=1)[:, None]
+
+        pose_idx, joints_idx = np.nonzero(poses[..., 2] <= 0)
+        if len(pose_idx) == 0:
+            return poses
+
+        idx = np.empty(len(joints_idx), np.int64)
+        if prior_joints is None:
+            local = np.zeros(len(joints_idx), bool)
         else:
-            tags = []
-            for i in range(K):
-                if keypoints[i, 2] > 0:
-                    x, y = keypoints[i][:2].astype(int)
-                    tags.append(tag[i, y, x])
-            prev_tag = np.mean(tags, axis=0)
-
-        for i, (_heatmap, _tag) in enumerate(zip(heatmap, tag)):
-            if keypoints[i, 2] > 0:
-                continue
-            # Get position with the closest tag value to the pose tag.
-            diff = np.abs(_tag[..., 0] - prev_tag) + 0.5
-            diff = diff.astype(np.int32).astype(_heatmap.dtype)
-            diff -= _heatmap
-            idx = diff.argmin()
-            y, x = np.divmod(idx, _heatmap.shape[-1])
-            # Corresponding keypoint detection score.
-            val = _heatmap[y, x]
-            if val > 0:
-                keypoints[i, :3] = x, y, val
-                if 1 < x < W - 1 and 1 < y < H - 1:
-                    diff = np.array([
-                        _heatmap[y, x + 1] - _heatmap[y, x - 1],
-                        _heatmap[y + 1, x] - _heatmap[y - 1, x]
-                    ])
-                    keypoints[i, :2] += np.sign(diff) * .25
-
-        return keypoints
+            local = prior_joints[pose_idx, joints_idx, 2] > 0
+        if local.any():
+            local_joints = prior_joints[pose_idx[local], joints_idx[local]]
+            idx[local] = cls._local_maximum(heatmap, joints_idx[local], local_joints, window)
+
+        # Get position with the closest tag value to the pose tag, processing all poses missing a joint at once.
+        for k in np.unique(joints_idx[~local]):
+            missing = (joints_idx == k) & ~local
+            diff = tag[k, ..., 0][None] - pose_tags[pose_idx[missing], 0][:, None, None]
+            np.abs(diff, out=diff)
+            diff += 0.5
+            np.floor(diff, out=diff)
+            diff -= heatmap[k]
+            idx[missing] = diff.reshape(len(diff), -1).argmin(axis=1)
+        y, x = np.divmod(idx, W)
+        # Corresponding keypoint detection score.
+        val = heatmap[joints_idx, y, x]
+
+        found = val > 0
+        pose_idx, joints_idx, x, y, val = pose_idx[found], joints_idx[found], x[found], y[found], val[found]
+        keypoints = np.stack((x, y), axis=-1).astype(poses.dtype)
+        keypoints += cls._shift_to_higher_neighbour(heatmap, joints_idx, x, y)
+        poses[pose_idx, joints_idx, :2] = keypoints
+        poses[pose_idx, joints_idx, 2] = val
+        return poses
+
+    @staticmethod
+    def _local_maximum(heatmap, joints_idx, joints, window):
+        """Flat index of the heatmap maximum in a window around every joint"""
+        H, W = heatmap.shape[-2:]
+        offsets = np.arange(-window, window + 1)
+        xs = np.clip(joints[:, 0].astype(int)[:, None] + offsets, 0, W - 1)
+        ys = np.clip(joints[:, 1].astype(int)[:, None] + offsets, 0, H - 1)
+        patches = heatmap[joints_idx[:, None, None], ys[:, :, None], xs[:, None, :]]
+        best_y, best_x = np.divmod(patches.reshape(len(joints_idx), -1).argmax(axis=1), len(offsets))
+        rows = np.arange(len(joints_idx))
+        return ys[rows, best_y] * W + xs[rows, best_x]
+
+    @staticmethod
+    def _sample_prior_tags(tag, prior):
+        """
+        Tags of the current frame at the previous joint positions of the prior poses.
+
+        Embeddings are only consistent within a frame, so carried tags are used only for poses
+        without visible joints.
+        """
+        K, H, W = tag.shape[:3]
+        tag = tag.reshape(K, H, W, -1)
+        visible = prior.joints[..., 2] > 0
+        x = np.clip(np.rint(prior.joints[..., 0]).astype(int), 0, W - 1)
+        y = np.clip(np.rint(prior.joints[..., 1]).astype(int), 0, H - 1)
+        sampled = tag[np.arange(K)[None], y, x] * visible[..., None]
+        counts = visible.sum(axis=1)
+        return np.where(counts[:, None] > 0, sampled.sum(axis=1) / np.maximum(counts, 1)[:, None], prior.tags)
 
     def __call__(self, heatmaps, tags, nms_heatmaps):
+        ans, scores, _, _ = self.decode(heatmaps, tags, nms_heatmaps)
+        return ans, scores
+
+    def decode(self, heatmaps, tags, nms_heatmaps, prior=None):
+        """
+        Group joints into poses, optionally seeding the grouping with the poses of the previous frame.
+
+        Returns poses, their scores, tags and indexes of the prior poses they continue (-1 for new poses).
+        """
         tag_k, loc_k, val_k = self.top_k(nms_heatmaps, tags)
-        ans = tuple(map(self._match_by_tag, zip(tag_k, loc_k, val_k)))  # Call _match_by_tag() for each element in batch
-        ans, ans_tags = map(list, zip(*ans))
+        if prior is not None:
+            prior = prior._replace(tags=self._sample_prior_tags(tags[0], prior))
+        # Call _match_by_tag() for each element in batch
+        ans = tuple(self._match_by_tag(inp, prior) for inp in zip(tag_k, loc_k, val_k))
+        ans, ans_tags, ans_seeds = map(list, zip(*ans))
 
         np.abs(heatmaps, out=heatmaps)
 
@@ -326,9 +530,7 @@ class AssociativeEmbeddingDecoder:
 
         if self.delta != 0.0:
             for people in ans:
-                for person in people:
-                    for joint in person:
-                        joint[:2] += self.delta
+                people[..., :2] += self.delta
 
         ans = ans[0]
         scores = np.asarray([i[:, 2].mean() for i in ans])
@@ -336,10 +538,18 @@ class AssociativeEmbeddingDecoder:
         ans = ans[mask]
         scores = scores[mask]
 
-        if self.do_refine:
-            heatmap_numpy = heatmaps[0]
-            tag_numpy = tags[0]
-            for i, pose in enumerate(ans):
-                ans[i] = self.refine(heatmap_numpy, tag_numpy, pose, ans_tags[0][i])
+        ans_tags = ans_tags[0][mask]
+        seeds = ans_seeds[0][mask]
 
-        return ans, scores
+        if self.do_refine:
+            prior_joints = None
+            if prior is not None:
+                # Stable poses look for their missing joints next to where they were in the previous frame
+                prior_joints = np.zeros((len(ans), self.num_joints, 3), np.float32)
+                continued = seeds >= 0
+                stable = continued.copy()
+                stable[continued] = prior.stable[seeds[continued]]
+                prior_joints[stable] = prior.joints[seeds[stable]]
+            ans = self.refine(heatmaps[0], tags[0], ans, ans_tags, prior_joints, self.refine_window)
+
+        return ans, scores, ans_tags, seeds
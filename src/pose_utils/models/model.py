@@ -21,6 +21,7 @@ class Model:
     def __init__(self, ie, model_path, input_transform=None):
         self.logger = logging.getLogger()
         self.logger.info('Reading network from IR...')
+        self.model_path = model_path
         self.net = ie.read_network(model_path)
         self.set_batch_size(1)
         self.input_transform = input_transform
@@ -29,6 +30,13 @@ class Model:
         meta = {}
         return inputs, meta
 
+    def preprocess_into(self, inputs, buffers):
+        """Preprocess inputs straight into the input buffers of an infer request and return the meta"""
+        dict_inputs, meta = self.preprocess(inputs)
+        for name, data in dict_inputs.items():
+            buffers[name][...] = data
+        return meta
+
     def postprocess(self, outputs, meta):
         return outputs
 
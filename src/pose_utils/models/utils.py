@@ -101,6 +101,45 @@ def resize_image(image, size, keep_aspect_ratio=False):
     return resized_frame
 
 
+class PaddedResize:
+    """
+    Resizes images keeping aspect ratio directly into a preallocated NCHW tensor.
+
+    The part of the tensor not covered by the image is filled with zeros. The intermediate
+    HWC image is kept between calls, so no memory is allocated while the input size is constant.
+    """
+
+    def __init__(self, size, padding_mode='right_bottom', interpolation=cv2.INTER_AREA):
+        self.w, self.h = size
+        self.padding_mode = padding_mode
+        self.interpolation = interpolation
+        self.resized = None
+
+    def get_resized_size(self, image_shape):
+        ih, iw = image_shape[:2]
+        scale = min(self.h / ih, self.w / iw)
+        return min(round(iw * scale), self.w), min(round(ih * scale), self.h)
+
+    def __call__(self, image, tensor):
+        """Write image into tensor of shape (1, C, h, w), return the size of the resized image"""
+        w, h = self.get_resized_size(image.shape)
+        if self.resized is None or self.resized.shape[:2] != (h, w) or self.resized.dtype != image.dtype:
+            self.resized = np.empty((h, w) + image.shape[2:], image.dtype)
+        cv2.resize(image, (w, h), dst=self.resized, interpolation=self.interpolation)
+
+        if self.padding_mode == 'center':
+            top, left = (self.h - h + 1) // 2, (self.w - w + 1) // 2
+        else:
+            top, left = 0, 0
+        planes = tensor[0]
+        planes[:, top:top + h, left:left + w] = self.resized.transpose((2, 0, 1))
+        planes[:, :top] = 0
+        planes[:, top + h:] = 0
+        planes[:, top:top + h, :left] = 0
+        planes[:, top:top + h, left + w:] = 0
+        return w, h
+
+
 def resize_image_letterbox(image, size):
     ih, iw = image.shape[0:2]
     w, h = size
@@ -1,6 +1,8 @@
 from .async_pipeline import get_user_config, AsyncPipeline
+from .network_cache import NetworkCache
 
 __all__ = [
     'get_user_config',
     'AsyncPipeline',
+    'NetworkCache',
 ]
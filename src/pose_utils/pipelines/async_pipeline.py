@@ -16,6 +16,7 @@
 
 import logging
 import threading
+import time
 from collections import deque
 from typing import Dict, Set
 
@@ -81,22 +82,35 @@ def get_user_config(flags_d: str, flags_nstreams: str, flags_nthreads: int)-> Di
 
 
 class AsyncPipeline:
-    def __init__(self, ie, model, plugin_config, device='CPU', max_num_requests=1):
+    def __init__(self, ie, model, plugin_config, device='CPU', max_num_requests=1, network_cache=None):
         self.model = model
         self.logger = logging.getLogger()
 
+        def load_network(num_requests, reload=False):
+            if network_cache is not None:
+                return network_cache.load_network(self.model.net, self.model.model_path, device,
+                                                  plugin_config, num_requests, reload)
+            return ie.load_network(network=self.model.net, device_name=device,
+                                   config=plugin_config, num_requests=num_requests)
+
         self.logger.info('Loading network to {} plugin...'.format(device))
-        self.exec_net = ie.load_network(network=self.model.net, device_name=device,
-                                        config=plugin_config, num_requests=max_num_requests)
+        self.exec_net = load_network(max_num_requests)
         if max_num_requests == 0:
             # ExecutableNetwork doesn't allow creation of additional InferRequests. Reload ExecutableNetwork
             # +1 to use it as a buffer of the pipeline
-            self.exec_net = ie.load_network(network=self.model.net, device_name=device,
-                                            config=plugin_config, num_requests=len(self.exec_net.requests) + 1)
+            self.exec_net = load_network(len(self.exec_net.requests) + 1, reload=True)
 
         self.empty_requests = deque(self.exec_net.requests)
+        # Inputs are preprocessed straight into the input blobs of a request, which are reused across frames
+        self.input_buffers = {
+            request: {name: blob.buffer for name, blob in request.input_blobs.items()}
+            for request in self.exec_net.requests
+        }
         self.completed_request_results = {}
-        self.callback_exceptions = {}
+        # Requests by id from submission until their result is handed out, as their output
+        # blobs hold the result until then
+        self.busy_requests = {}
+        self.callback_exceptions = []
         self.event = threading.Event()
 
     def inference_completion_callback(self, status, callback_args):
@@ -105,36 +119,51 @@ class AsyncPipeline:
             if status != 0:
                 raise RuntimeError('Infer Request has returned status code {}'.format(status))
             raw_outputs = {key: blob.buffer for key, blob in request.output_blobs.items()}
+            meta['completion_time'] = time.perf_counter()
             self.completed_request_results[id] = (raw_outputs, meta, preprocessing_meta)
-            self.empty_requests.append(request)
         except Exception as e:
             self.callback_exceptions.append(e)
         self.event.set()
 
-    def submit_data(self, inputs, id, meta):
+    def submit_data(self, inputs, id, meta, **preprocess_params):
         request = self.empty_requests.popleft()
         if len(self.empty_requests) == 0:
             self.event.clear()
-        inputs, preprocessing_meta = self.model.preprocess(inputs)
+        preprocessing_meta = self.model.preprocess_into(inputs, self.input_buffers[request], **preprocess_params)
         request.set_completion_callback(py_callback=self.inference_completion_callback,
                                         py_data=(request, id, meta, preprocessing_meta))
-        request.async_infer(inputs=inputs)
+        self.busy_requests[id] = request
+        request.async_infer()
+
+    def release(self, id):
+        self.empty_requests.append(self.busy_requests.pop(id))
 
     def get_raw_result(self, id):
+        """
+        Raw outputs are views of the output blobs of the request, which is free for new
+        submissions afterwards. They are valid until the next submit_data.
+        """
         if id in self.completed_request_results:
+            self.release(id)
             return self.completed_request_results.pop(id)
         return None
 
     def get_result(self, id):
-        result = self.get_raw_result(id)
-        if result:
-            raw_result, meta, preprocess_meta = result
-            return self.model.postprocess(raw_result, preprocess_meta), meta
+        if id in self.completed_request_results:
+            raw_result, meta, preprocess_meta = self.completed_request_results.pop(id)
+            try:
+                return self.model.postprocess(raw_result, preprocess_meta), meta
+            finally:
+                # Postprocessing reads and partly overwrites the output blobs
+                self.release(id)
         return None
 
     def is_ready(self):
         return len(self.empty_requests) != 0
 
+    def is_completed(self, id):
+        return id in self.completed_request_results
+
     def has_completed_request(self):
         return len(self.completed_request_results) != 0
 
@@ -145,3 +174,7 @@ class AsyncPipeline:
     def await_any(self):
         if len(self.empty_requests) == 0:
             self.event.wait()
+
+    def await_request(self, id):
+        if id in self.busy_requests:
+            self.busy_requests[id].wait()
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+from openvino.inference_engine import get_version
+
+
+class NetworkCache:
+    """
+    On-disk cache of compiled networks.
+
+    On devices able to export compiled networks they are exported to the cache directory
+    after compilation and imported on later launches. Other devices get OpenVINO's own model
+    cache through CACHE_DIR, which is used by the plugins implementing it.
+
+    Entries are keyed by the model files with their modification times, the reshaped network
+    inputs and outputs, the device, the plugin config and the Inference Engine version. An index
+    keeps the model files and version of every entry, entries of model files changed or removed
+    since and of other versions are removed when the cache is opened.
+    """
+
+    def __init__(self, ie, cache_dir):
+        self.ie = ie
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.plugin_cache_dir = self.cache_dir / 'plugin'
+        self.plugin_cache_dir.mkdir(exist_ok=True)
+        self.logger = logging.getLogger()
+        self.hits = 0
+        self.misses = 0
+
+        self.index_path = self.cache_dir / 'index.json'
+        self.index = {}
+        if self.index_path.exists():
+            try:
+                self.index = json.loads(self.index_path.read_text())
+            except ValueError as e:
+                self.logger.warning('Unable to read network cache index {}: {}'.format(self.index_path, e))
+        self.prune()
+
+    @staticmethod
+    def get_model_files(model_path):
+        model_path = Path(model_path).resolve()
+        files = [path for path in (model_path, model_path.with_suffix('.bin')) if path.exists()]
+        return [[str(path), path.stat().st_mtime_ns, path.stat().st_size] for path in files]
+
+    @classmethod
+    def get_key(cls, net, model_path, device, plugin_config):
+        description = {
+            'model': cls.get_model_files(model_path),
+            'inputs': {name: (info.input_data.shape, info.precision, info.layout)
+                       for name, info in net.input_info.items()},
+            'outputs': {name: (data.shape, data.precision) for name, data in net.outputs.items()},
+            'device': device,
+            'config': plugin_config,
+            'version': get_version(),
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:32]
+
+    @staticmethod
+    def is_current(entry):
+        """Whether the model files of an index entry are unchanged and it is of this Inference Engine version"""
+        if entry.get('version') != get_version():
+            return False
+        for name, mtime, size in entry.get('model', ()):
+            path = Path(name)
+            if not path.exists() or path.stat().st_mtime_ns != mtime or path.stat().st_size != size:
+                return False
+        return True
+
+    def prune(self):
+        """Remove stale entries and files of the cache missing from the index"""
+        stale = [key for key, entry in self.index.items() if not self.is_current(entry)]
+        for key in stale:
+            del self.index[key]
+
+        # Keys of the removed entries, an exported network and a plugin cache directory share their key
+        removed = set(stale)
+        for path in list(self.cache_dir.iterdir()) + list(self.plugin_cache_dir.iterdir()):
+            if path in (self.index_path, self.plugin_cache_dir) or path.stem in self.index:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink()
+            if path.suffix != '.partial':
+                removed.add(path.stem)
+        if stale:
+            self.save_index()
+        if removed:
+            self.logger.info('Removed {} stale entries from the network cache'.format(len(removed)))
+
+    def save_index(self):
+        partial_path = self.index_path.with_suffix('.partial')
+        partial_path.write_text(json.dumps(self.index, indent=1))
+        os.replace(partial_path, self.index_path)
+
+    def supports_export(self, device):
+        try:
+            return 'EXPORT_IMPORT' in self.ie.get_metric(device, 'OPTIMIZATION_CAPABILITIES')
+        except RuntimeError:
+            return False
+
+    def load_network(self, net, model_path, device, plugin_config, num_requests, reload=False):
+        """
+        Load the network through the cache. A reload of a network loaded before in this launch,
+        e.g. with another number of requests, is not counted as a hit or a miss.
+        """
+        start = time.perf_counter()
+        key = self.get_key(net, model_path, device, plugin_config)
+        if not self.supports_export(device):
+            exec_net, hit = self._load_with_plugin_cache(net, key, device, plugin_config, num_requests)
+        else:
+            exec_net, hit = self._load_with_export(net, key, device, plugin_config, num_requests)
+
+        if key not in self.index:
+            self.index[key] = {'model': self.get_model_files(model_path), 'version': get_version()}
+            self.save_index()
+        if reload:
+            self.logger.debug('Network {} reloaded with {} infer requests in {:.2f} s'.format(
+                Path(model_path).name, num_requests, time.perf_counter() - start))
+            return exec_net
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.logger.info('Network cache {} for {}, loaded in {:.2f} s'.format(
+            'hit' if hit else 'miss', Path(model_path).name, time.perf_counter() - start))
+        return exec_net
+
+    def _load_with_export(self, net, key, device, plugin_config, num_requests):
+        path = self.cache_dir / '{}.blob'.format(key)
+        if path.exists():
+            try:
+                exec_net = self.ie.import_network(model_file=str(path), device_name=device,
+                                                  config=plugin_config, num_requests=num_requests)
+                return exec_net, True
+            except RuntimeError as e:
+                self.logger.warning('Unable to import cached network {}: {}'.format(path, e))
+                path.unlink()
+
+        exec_net = self.ie.load_network(network=net, device_name=device,
+                                        config=plugin_config, num_requests=num_requests)
+        # Export next to the destination first, so that an interrupted export never leaves a broken entry
+        partial_path = path.with_suffix('.partial')
+        exec_net.export(str(partial_path))
+        os.replace(partial_path, path)
+        return exec_net, False
+
+    def _load_with_plugin_cache(self, net, key, device, plugin_config, num_requests):
+        # Every key gets a directory of its own, so that only files of this network tell about a hit
+        plugin_cache_dir = self.plugin_cache_dir / key
+        plugin_cache_dir.mkdir(exist_ok=True)
+        entries = self._list_entries(plugin_cache_dir)
+        try:
+            self.ie.set_config({'CACHE_DIR': str(plugin_cache_dir)}, device)
+            cached = True
+        except RuntimeError as e:
+            self.logger.warning('{} does not support network caching: {}'.format(device, e))
+            cached = False
+        exec_net = self.ie.load_network(network=net, device_name=device,
+                                        config=plugin_config, num_requests=num_requests)
+        # The plugin writes or rewrites an entry whenever it has compiled the network
+        return exec_net, cached and bool(entries) and self._list_entries(plugin_cache_dir) == entries
+
+    @staticmethod
+    def _list_entries(directory):
+        return {path.name: path.stat().st_mtime_ns for path in directory.iterdir()}
+
+    def log_summary(self):
+        self.logger.info('Network cache: {} hits, {} misses'.format(self.hits, self.misses))
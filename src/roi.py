@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class PersonRoi:
+    """
+    Region of the frame around the tracked players that inference runs on.
+
+    The region is the bounding box of the confident joints of the previous result, padded by
+    padding of its size on every side and widened to the frame aspect ratio, so that the
+    network input keeps its shape and the players get more of its pixels. Full frame is used
+    when nobody or more than max_people are tracked, when the region would cover more than
+    max_size of the frame width and on every full_frame_interval-th inference, which finds
+    people entering the frame.
+    """
+
+    def __init__(self, frame_shape, padding=0.2, min_size=0.3, max_size=0.8, max_people=1, score_threshold=0.2,
+                 full_frame_interval=30):
+        self.height, self.width = frame_shape[:2]
+        self.padding = padding
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_people = max_people
+        self.score_threshold = score_threshold
+        self.full_frame_interval = full_frame_interval
+        self.selected = 0
+        self.cropped = 0
+
+    @property
+    def cropped_share(self):
+        return self.cropped / self.selected if self.selected else 0.0
+
+    def select(self, people):
+        """Region (x0, y0, x1, y1) in pixels for poses of the previous result, None for the full frame"""
+        self.selected += 1
+        if not people or len(people) > self.max_people or self.selected % self.full_frame_interval == 0:
+            return None
+        confident = people.visible(self.score_threshold)
+        if not confident.any():
+            return None
+
+        points = people.xy[confident] * (self.width, self.height)
+        (left, top), (right, bottom) = points.min(axis=0), points.max(axis=0)
+        box_width = (right - left) * (1 + 2 * self.padding)
+        box_height = (bottom - top) * (1 + 2 * self.padding)
+        aspect_ratio = self.width / self.height
+        box_width = max(box_width, box_height * aspect_ratio, self.min_size * self.width)
+        if box_width > self.max_size * self.width:
+            return None
+        box_height = box_width / aspect_ratio
+
+        # The region is centered on the joints and moved inside the frame
+        x0 = int(np.clip(round((left + right - box_width) / 2), 0, self.width - box_width))
+        y0 = int(np.clip(round((top + bottom - box_height) / 2), 0, self.height - box_height))
+        self.cropped += 1
+        return x0, y0, x0 + round(box_width), y0 + round(box_height)
@@ -0,0 +1,96 @@
+"""
+Recorded sessions of inference results.
+
+A session is saved as .npz with the capture timestamps and sequence numbers of the inferred
+frames, their shape, joints padded with NaN to (frames, people, joints, 3) and track ids
+padded with -1 to (frames, people).
+"""
+import numpy as np
+
+from utils import FrameInfo, PoseResult, Poses, log
+
+
+class SessionRecorder:
+    def __init__(self):
+        self.results = []
+
+    def append(self, result):
+        self.results.append(result)
+
+    def save(self, path):
+        save_session(path, self.results)
+        log.info(f'Session of {len(self.results)} results saved to {path}')
+
+
+def save_session(path, results):
+    num_people = max((len(result.joints) for result in results), default=0)
+    num_joints = max((result.joints.data.shape[1] for result in results), default=0)
+    joints = np.full((len(results), num_people, num_joints, 3), np.nan, np.float32)
+    track_ids = np.full((len(results), num_people), -1, np.int64)
+    for index, result in enumerate(results):
+        people, result_joints, _ = result.joints.data.shape
+        joints[index, :people, :result_joints] = result.joints.data
+        track_ids[index, :len(result.track_ids)] = result.track_ids
+
+    np.savez_compressed(
+        path,
+        seqs=np.array([result.frame.seq for result in results], np.int64),
+        timestamps=np.array([result.frame.timestamp for result in results], np.float64),
+        shape=np.array(results[0].frame.shape if results else (0, 0, 0), np.int64),
+        joints=joints,
+        track_ids=track_ids,
+    )
+
+
+def load_session(path):
+    with np.load(path) as session:
+        return session_results(session['seqs'], session['timestamps'], tuple(session['shape']),
+                               session['joints'], session['track_ids'])
+
+
+def session_results(seqs, timestamps, shape, joints, track_ids):
+    """PoseResult list from session arrays, people with track id -1 are padding"""
+    results = []
+    for seq, timestamp, frame_joints, frame_ids in zip(seqs, timestamps, joints, track_ids):
+        people = frame_ids >= 0
+        info = FrameInfo(int(seq), float(timestamp), shape)
+        results.append(PoseResult(info, Poses(frame_joints[people]), [int(i) for i in frame_ids[people]]))
+    return results
+
+
+# Joints of a person standing in the frame center in the order of IntelPoseModel.Landmark
+_STANDING_POSE = np.array([
+    (0.50, 0.20), (0.52, 0.18), (0.48, 0.18), (0.54, 0.19), (0.46, 0.19),
+    (0.57, 0.30), (0.43, 0.30), (0.62, 0.42), (0.38, 0.42), (0.64, 0.53), (0.36, 0.53),
+    (0.55, 0.55), (0.45, 0.55), (0.56, 0.72), (0.44, 0.72), (0.56, 0.88), (0.44, 0.88),
+])
+_ELBOWS, _WRISTS, _KNEES, _ANKLES = (7, 8), (9, 10), (13, 14), (15, 16)
+
+
+def synthetic_session(duration=30.0, fps=30.0, num_people=2, shape=(720, 1280, 3), noise=0.002, seed=0):
+    """
+    Session of people dancing in place, moving their arms and legs along Lissajous curves.
+
+    Hands sweep up to an eighth of the frame at up to 1 Hz, about a meter per second for a player
+    filling the frame width.
+    """
+    rng = np.random.default_rng(seed)
+    times = np.arange(int(duration * fps)) / fps
+    num_joints = len(_STANDING_POSE)
+    joints = np.zeros((len(times), num_people, num_joints, 3), np.float32)
+    for person in range(num_people):
+        offset = (person + 0.5) / num_people - 0.5
+        base = _STANDING_POSE + (offset, 0)
+        motion = np.zeros((len(times), num_joints, 2))
+        for limbs, joints_end, amplitude in ((_ELBOWS, _WRISTS, 0.12), (_KNEES, _ANKLES, 0.04)):
+            for middle, end in zip(limbs, joints_end):
+                frequency = rng.uniform(0.3, 1.0, 2)
+                phase = rng.uniform(0, 2 * np.pi, 2)
+                sweep = amplitude * np.sin(2 * np.pi * frequency * times[:, None] + phase)
+                motion[:, end] = sweep
+                motion[:, middle] = sweep / 2
+        positions = base + motion + rng.normal(0, noise, motion.shape)
+        joints[:, person, :, :2] = np.clip(positions, 0, 1)
+        joints[:, person, :, 2] = rng.uniform(0.5, 1, (len(times), num_joints))
+    track_ids = np.tile(np.arange(num_people), (len(times), 1))
+    return session_results(np.arange(len(times)), times, tuple(shape), joints, track_ids)
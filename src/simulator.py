@@ -0,0 +1,169 @@
+"""
+Headless game simulator.
+
+Games are driven by the joints of a recorded or synthetic session, a clock following the
+session timestamps and a seeded random generator, so that runs are reproducible without a
+camera or a window. Prints the final scores, a digest of the final game state and the time
+spent in the game per frame; exits with 1 when a frame time limit is exceeded.
+
+Run from the project root, e.g. `python src/simulator.py --mode intensive --players 2 --no-draw`
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from config import config
+from gameplay import GameWithFriendOpenVINO, SoloClassic, SoloIntensiveFastAim
+from session import load_session, synthetic_session
+
+MODES = {
+    'classic': SoloClassic,
+    'intensive': SoloIntensiveFastAim,
+}
+
+
+class SimulatedClock:
+    """Clock set to the capture timestamp of the simulated frame"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def repeated(results, times):
+    """Session results played times in a row, timestamps and sequence numbers keep increasing"""
+    if times == 1 or not results:
+        return results
+    first, last = results[0].frame, results[-1].frame
+    period = (last.timestamp - first.timestamp) * len(results) / max(len(results) - 1, 1)
+    return [
+        result._replace(frame=result.frame._replace(seq=result.frame.seq + loop * len(results),
+                                                    timestamp=result.frame.timestamp + loop * period))
+        for loop in range(times) for result in results
+    ]
+
+
+class Simulator:
+    """
+    Game of mode for one or two players fed with the session results frame by frame.
+
+    Solo games get the first person only and joints are mirrored like the display does.
+    Without draw, games get no frame and skip drawing.
+    """
+
+    def __init__(self, results, mode='classic', players=1, seed=0, draw=True):
+        if not results:
+            raise ValueError('Session has no frames')
+        self.results = results
+        self.players = players
+        self.clock = SimulatedClock(results[0].frame.timestamp)
+        self.rng = random.Random(seed)
+        shape = results[0].frame.shape
+        self.frame = np.zeros(shape, np.uint8) if draw else None
+
+        game_class = MODES[mode]
+        if players == 2:
+            area = (shape[0], shape[1] // 2, shape[2])
+            self.games = [game_class(area, self.clock, self.rng), game_class(area, self.clock, self.rng)]
+            self.game = GameWithFriendOpenVINO(shape, *self.games)
+        else:
+            self.game = game_class(shape, self.clock, self.rng)
+            self.games = [self.game]
+        self.frame_times = []
+        self.game_over = False
+
+    def run(self):
+        for result in self.results:
+            self.clock.now = result.frame.timestamp
+            joints = result.joints.flip() if config.app.flip_image else result.joints
+            if self.players == 1:
+                joints = joints[:1]
+            if self.frame is not None:
+                # Stands in for the camera frame the display copies in
+                self.frame.fill(0)
+
+            start = time.perf_counter()
+            running = self.game.process(self.frame, joints)
+            self.frame_times.append(time.perf_counter() - start)
+            if not running:
+                self.game_over = True
+                break
+
+    @property
+    def scores(self):
+        return [game.score for game in self.games]
+
+    def digest(self):
+        """Hash of the scores and objects of the games, equal for runs behaving the same"""
+        digest = hashlib.sha256()
+        for game in self.games:
+            entities = game.entities
+            digest.update(np.array([game.score, len(entities)], np.int64).tobytes())
+            for column in (entities.kind, entities.center, entities.progress, entities.earned_progress):
+                digest.update(np.ascontiguousarray(column).tobytes())
+        return digest.hexdigest()[:16]
+
+    def summary(self):
+        times = np.array(self.frame_times) * 1000
+        return {
+            'frames': len(times),
+            'simulated_seconds': self.clock.now - self.results[0].frame.timestamp,
+            'game_over': self.game_over,
+            'scores': self.scores,
+            'digest': self.digest(),
+            'frame_ms': {
+                'mean': float(times.mean()),
+                'p50': float(np.percentile(times, 50)),
+                'p99': float(np.percentile(times, 99)),
+                'max': float(times.max()),
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=MODES, default='classic')
+    parser.add_argument('--players', type=int, choices=(1, 2), default=1)
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the game and of the synthetic session')
+    parser.add_argument('--session', help='.npz session recorded with config.recording.session_path')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds of the synthetic session')
+    parser.add_argument('--repeat', type=int, default=1, help='Times the session is played in a row')
+    parser.add_argument('--no-draw', action='store_true', help='Skip drawing the objects')
+    parser.add_argument('--json', help='Write the summary with the time of every frame to this file')
+    parser.add_argument('--max-p99-ms', type=float, help='Exit with 1 when the 99th percentile frame time exceeds it')
+    args = parser.parse_args()
+
+    if args.session:
+        results = load_session(args.session)
+    else:
+        results = synthetic_session(duration=args.duration, num_people=args.players, seed=args.seed)
+    simulator = Simulator(repeated(results, args.repeat), args.mode, args.players, args.seed, draw=not args.no_draw)
+    start = time.perf_counter()
+    simulator.run()
+    elapsed = time.perf_counter() - start
+    summary = simulator.summary()
+
+    frame_ms = summary['frame_ms']
+    print(f'{args.mode} game of {args.players} player(s), seed {args.seed}: {summary["frames"]} frames, '
+          f'{summary["simulated_seconds"]:.1f} s simulated{", game over" if summary["game_over"] else ""}')
+    print(f'  scores {summary["scores"]}, state digest {summary["digest"]}')
+    print(f'  {summary["frames"] / elapsed:.0f} frames per second, game time per frame {frame_ms["mean"]:.3f} ms mean, '
+          f'{frame_ms["p50"]:.3f} ms p50, {frame_ms["p99"]:.3f} ms p99, {frame_ms["max"]:.3f} ms max')
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(dict(summary, frame_times_ms=[t * 1000 for t in simulator.frame_times]), file, indent=1)
+    if args.max_p99_ms is not None and frame_ms['p99'] > args.max_p99_ms:
+        print(f'  p99 frame time exceeds {args.max_p99_ms} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
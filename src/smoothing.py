@@ -0,0 +1,180 @@
+import math
+
+import numpy as np
+
+from utils import PoseResult, Poses
+
+
+class TrackFilter:
+    """
+    Base of filters smoothing joints of all tracked people at once.
+
+    Filter state is kept in arrays with a row per track id. Joints are given as (people, joints, 3)
+    arrays of x, y and score; NaN joints are unknown and stay NaN. Tracks not seen for max_age
+    seconds are forgotten.
+    """
+
+    def __init__(self, max_age=0.5):
+        self.max_age = max_age
+        self.ids = np.zeros(0, np.int64)
+        self.timestamps = np.zeros(0)
+        self.state = {}
+
+    def __call__(self, joints, track_ids, timestamp):
+        joints = np.asarray(joints, np.float64)
+        track_ids = np.asarray(track_ids, np.int64)
+        self._forget(timestamp)
+
+        smoothed = joints.copy()
+        if not len(joints):
+            return smoothed
+        rows = {track_id: row for row, track_id in enumerate(self.ids)}
+        rows = np.array([rows.get(track_id, -1) for track_id in track_ids], np.int64)
+
+        known = rows >= 0
+        if known.any():
+            dt = timestamp - self.timestamps[rows[known]]
+            smoothed[known, :, :2] = self.update(rows[known], joints[known], np.maximum(dt, 1e-6)[:, None, None])
+            self.timestamps[rows[known]] = timestamp
+        if not known.all():
+            self._append(track_ids[~known], joints[~known], timestamp)
+        return smoothed
+
+    def _append(self, track_ids, joints, timestamp):
+        state = self.initial_state(joints)
+        if not self.state:
+            self.state = {name: np.zeros((0, *values.shape[1:])) for name, values in state.items()}
+        self.state = {name: np.concatenate((self.state[name], state[name])) for name in self.state}
+        self.ids = np.concatenate((self.ids, track_ids))
+        self.timestamps = np.concatenate((self.timestamps, np.full(len(track_ids), timestamp)))
+
+    def _forget(self, timestamp):
+        kept = timestamp - self.timestamps <= self.max_age
+        if not kept.all():
+            self.ids = self.ids[kept]
+            self.timestamps = self.timestamps[kept]
+            self.state = {name: values[kept] for name, values in self.state.items()}
+
+    def initial_state(self, joints):
+        """State arrays of new tracks with joints as their first measurement"""
+        raise NotImplementedError
+
+    def update(self, rows, joints, dt):
+        """Filter joints of the tracks in rows of the state, dt is time since their last update"""
+        raise NotImplementedError
+
+
+class OneEuroFilter(TrackFilter):
+    """
+    One Euro filter: a low-pass filter with the cutoff frequency growing with speed,
+    so slow motion is smoothed strongly and fast motion keeps up with little lag.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=20.0, d_cutoff=1.0, max_age=0.5):
+        super().__init__(max_age)
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        return 1 / (1 + 1 / (2 * math.pi * cutoff * dt))
+
+    def initial_state(self, joints):
+        return {'position': joints[..., :2].copy(), 'velocity': np.zeros(joints[..., :2].shape)}
+
+    def update(self, rows, joints, dt):
+        position = self.state['position'][rows]
+        velocity = self.state['velocity'][rows]
+        measured = joints[..., :2]
+        # Joints unknown so far take the first measurement as is
+        position = np.where(np.isnan(position), measured, position)
+        velocity = np.nan_to_num(velocity)
+
+        raw_velocity = (measured - position) / dt
+        velocity += self._alpha(self.d_cutoff, dt) * (raw_velocity - velocity)
+        speed = np.linalg.norm(velocity, axis=-1, keepdims=True)
+        cutoff = self.min_cutoff + self.beta * speed
+        filtered = position + self._alpha(cutoff, dt) * (measured - position)
+
+        # Keep the previous state of joints missing in this frame
+        missing = np.isnan(measured)
+        filtered[missing] = position[missing]
+        velocity[missing] = self.state['velocity'][rows][missing]
+        self.state['position'][rows] = filtered
+        self.state['velocity'][rows] = velocity
+        return np.where(missing, np.nan, filtered)
+
+
+class KalmanFilter(TrackFilter):
+    """
+    Constant velocity Kalman filter of every joint coordinate.
+
+    Process noise is white acceleration of the given spectral density, measurement noise
+    variance grows as joint score drops.
+    """
+
+    def __init__(self, process_noise=0.2, measurement_noise=1e-4, max_age=0.5):
+        super().__init__(max_age)
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+
+    def initial_state(self, joints):
+        shape = joints[..., :2].shape
+        return {
+            'position': joints[..., :2].copy(),
+            'velocity': np.zeros(shape),
+            # Covariance of position and velocity, initially unknown velocity
+            'p00': np.full(shape, self.measurement_noise),
+            'p01': np.zeros(shape),
+            'p11': np.ones(shape),
+        }
+
+    def update(self, rows, joints, dt):
+        s = {name: values[rows] for name, values in self.state.items()}
+        measured = joints[..., :2]
+        new = np.isnan(s['position']) & ~np.isnan(measured)
+
+        # Predict
+        q = self.process_noise
+        position = s['position'] + s['velocity'] * dt
+        p00 = s['p00'] + dt * (2 * s['p01'] + dt * s['p11']) + q * dt ** 3 / 3
+        p01 = s['p01'] + dt * s['p11'] + q * dt ** 2 / 2
+        p11 = s['p11'] + q * dt
+
+        # Update with the measured joints
+        scores = np.clip(joints[..., 2:3], 0.05, 1)
+        residual = measured - position
+        gain0 = p00 / (p00 + self.measurement_noise / scores)
+        gain1 = p01 / (p00 + self.measurement_noise / scores)
+        measured_mask = ~np.isnan(residual) & ~new
+        residual = np.where(measured_mask, residual, 0)
+        gain0 = np.where(measured_mask, gain0, 0)
+        gain1 = np.where(measured_mask, gain1, 0)
+        position += gain0 * residual
+        velocity = s['velocity'] + gain1 * residual
+        p11 = p11 - gain1 * p01
+        p00, p01 = (1 - gain0) * p00, (1 - gain0) * p01
+
+        # Joints unknown so far start at their first measurement
+        initial = self.initial_state(joints)
+        updated = {'position': position, 'velocity': velocity, 'p00': p00, 'p01': p01, 'p11': p11}
+        for name, values in updated.items():
+            self.state[name][rows] = np.where(new, initial[name], values)
+        return np.where(np.isnan(measured), np.nan, self.state['position'][rows])
+
+
+def create_filter(smoothing):
+    """Filter configured by config.smoothing or None if smoothing is off"""
+    if smoothing.method == 'one_euro':
+        return OneEuroFilter(smoothing.min_cutoff, smoothing.beta, smoothing.d_cutoff, smoothing.max_age)
+    if smoothing.method == 'kalman':
+        return KalmanFilter(smoothing.process_noise, smoothing.measurement_noise, smoothing.max_age)
+    if smoothing.method:
+        raise ValueError(f'Unknown smoothing method {smoothing.method}')
+    return None
+
+
+def smooth_result(joint_filter, result):
+    smoothed = joint_filter(result.joints.data, result.track_ids, result.frame.timestamp)
+    return PoseResult(result.frame, Poses(smoothed), result.track_ids)
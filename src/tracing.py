@@ -0,0 +1,165 @@
+import json
+import math
+import time
+
+from config import config
+from utils import log
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations in the spirit of HdrHistogram.
+
+    Every power of two above `lowest` seconds is split into `sub_buckets` linear buckets,
+    so recorded values keep a relative precision of about 1 / sub_buckets.
+    """
+
+    def __init__(self, lowest=1e-6, highest=60.0, sub_buckets=32):
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self.size = (math.frexp(highest / lowest)[1] + 1) * sub_buckets
+        self.counts = [0] * self.size
+        self.count = 0
+        self.max = 0.0
+
+    def index_of(self, seconds):
+        if seconds < self.lowest:
+            return 0
+        mantissa, exponent = math.frexp(seconds / self.lowest)
+        index = exponent * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets)
+        return min(index, self.size - 1)
+
+    def value_of(self, index):
+        exponent, sub_bucket = divmod(index, self.sub_buckets)
+        mantissa = 0.5 + (sub_bucket + 0.5) / (2 * self.sub_buckets)
+        return math.ldexp(mantissa, exponent) * self.lowest
+
+    def record(self, seconds):
+        self.counts[self.index_of(seconds)] += 1
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def reset(self):
+        self.counts = [0] * self.size
+        self.count = 0
+        self.max = 0.0
+
+    def percentiles(self, quantiles, other=None):
+        """Values at the given quantiles, optionally over the union with another histogram"""
+        counts = self.counts if other is None else [a + b for a, b in zip(self.counts, other.counts)]
+        total = sum(counts)
+        result = [0.0] * len(quantiles)
+        if total == 0:
+            return result
+
+        # Ranks of the requested quantiles in ascending order along with their position in the result
+        ranks = sorted((max(1, math.ceil(q * total)), i) for i, q in enumerate(quantiles))
+        found = 0
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            while found < len(ranks) and cumulative >= ranks[found][0]:
+                result[ranks[found][1]] = self.value_of(index)
+                found += 1
+            if found == len(ranks):
+                break
+        return result
+
+
+class StageStats:
+    """Rolling latency statistics of one stage covering the last one or two windows"""
+
+    def __init__(self, window):
+        self.window = window
+        self.window_start = time.perf_counter()
+        self.current = LatencyHistogram()
+        self.previous = LatencyHistogram()
+        self.total = LatencyHistogram()
+
+    def record(self, seconds, now):
+        if now - self.window_start >= self.window:
+            self.current, self.previous = self.previous, self.current
+            self.current.reset()
+            self.window_start = now
+        self.current.record(seconds)
+        self.total.record(seconds)
+
+    def merge(self, other):
+        """Add the samples of stats of the same stage, e.g. recorded in another process"""
+        self.current.merge(other.current)
+        self.previous.merge(other.previous)
+        self.total.merge(other.total)
+
+    def summary(self, rolling=True):
+        if rolling:
+            p50, p95, p99 = self.current.percentiles((0.5, 0.95, 0.99), other=self.previous)
+            count = self.current.count + self.previous.count
+            maximum = max(self.current.max, self.previous.max)
+        else:
+            p50, p95, p99 = self.total.percentiles((0.5, 0.95, 0.99))
+            count = self.total.count
+            maximum = self.total.max
+        return {'count': count, 'p50': p50, 'p95': p95, 'p99': p99, 'max': maximum}
+
+
+class Tracer:
+    """
+    Per-stage latency tracing of the frame pipeline.
+
+    Stages are stamped with `record(stage, start)`, which stores the time elapsed since
+    `start` and returns the current time so that consecutive stages can be chained.
+    Each stage is expected to be recorded from a single thread.
+    """
+
+    def __init__(self, enabled=True, window=10.0):
+        self.enabled = enabled
+        self.window = window
+        self.stages = {}
+
+    def record(self, stage, start, end=None):
+        if end is None:
+            end = time.perf_counter()
+        if self.enabled:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(self.window)
+            stats.record(end - start, end)
+        return end
+
+    def merge(self, stages):
+        """Add stage stats recorded by another tracer, e.g. the one of the inference process"""
+        for stage, stats in stages.items():
+            if stage in self.stages:
+                self.stages[stage].merge(stats)
+            else:
+                self.stages[stage] = stats
+
+    def summary(self, rolling=True):
+        """Latency percentiles in seconds for every stage recorded so far"""
+        return {stage: stats.summary(rolling) for stage, stats in list(self.stages.items())}
+
+    def log_summary(self, rolling=True):
+        for stage, stats in self.summary(rolling).items():
+            log.info(
+                f'{stage:>16}: p50 {stats["p50"] * 1000:7.2f} ms, p95 {stats["p95"] * 1000:7.2f} ms, '
+                f'p99 {stats["p99"] * 1000:7.2f} ms, max {stats["max"] * 1000:7.2f} ms [{stats["count"]} samples]'
+            )
+
+    def dump(self, path):
+        report = {
+            'rolling_window_seconds': self.window,
+            'rolling': self.summary(rolling=True),
+            'total': self.summary(rolling=False),
+        }
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        log.info(f'Latency report saved to {path}')
+
+
+tracer = Tracer(config.tracing.enabled, config.tracing.window)
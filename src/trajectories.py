@@ -0,0 +1,70 @@
+"""
+Paths of moving targets, computed once when a target spawns.
+
+Curves of TRAJECTORIES map parameters t in [0, 1] to points inside a box of the given
+semi-axes around the origin. `path` samples a curve densely and resamples it at equal arc
+length steps, so that a target moving a point per simulation step has a uniform speed and
+costs an index lookup per step.
+"""
+import math
+
+import numpy as np
+
+# Curve samples taken before resampling by arc length
+SAMPLES = 1024
+
+
+def ellipse(t, a, b, rng):
+    """Loop around the ellipse, starting from its left end"""
+    angle = 2 * np.pi * t
+    return np.stack([-a * np.cos(angle), b * np.sin(angle)], axis=1)
+
+
+def figure_eight(t, a, b, rng):
+    angle = 2 * np.pi * t
+    return np.stack([a * np.sin(angle), b * np.sin(2 * angle)], axis=1)
+
+
+def lissajous(t, a, b, rng):
+    """Lissajous curve of random small frequencies"""
+    x_frequency, y_frequency = rng.choice(((1, 3), (3, 2)))
+    angle = 2 * np.pi * t
+    return np.stack([a * np.sin(x_frequency * angle + np.pi / 2), b * np.sin(y_frequency * angle)], axis=1)
+
+
+def bezier(t, a, b, rng):
+    """Cubic Bezier curve across the box, through random control points"""
+    controls = np.array([(-a, rng.uniform(-b, b)), (rng.uniform(-a, a), rng.uniform(-b, b)),
+                         (rng.uniform(-a, a), rng.uniform(-b, b)), (a, rng.uniform(-b, b))])
+    t = t[:, None]
+    return ((1 - t) ** 3 * controls[0] + 3 * (1 - t) ** 2 * t * controls[1]
+            + 3 * (1 - t) * t ** 2 * controls[2] + t ** 3 * controls[3])
+
+
+TRAJECTORIES = {
+    'ellipse': ellipse,
+    'figure_eight': figure_eight,
+    'lissajous': lissajous,
+    'bezier': bezier,
+}
+
+
+def resample(points, step):
+    """Points along the polyline at every step of its arc length, starting with its first point"""
+    distance = np.concatenate([[0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    targets = np.arange(0, distance[-1] + step / 2, step)
+    return np.stack([np.interp(targets, distance, points[:, 0]), np.interp(targets, distance, points[:, 1])], axis=1)
+
+
+def path(name, a, b, step, rng, max_length=math.inf):
+    """
+    (steps, 2) float32 points relative to the box center of the curve called name, step apart.
+    Curves longer than max_length are scaled down to it.
+    """
+    if name not in TRAJECTORIES:
+        raise ValueError(f'Unknown trajectory {name}, available ones are {", ".join(TRAJECTORIES)}')
+    points = TRAJECTORIES[name](np.linspace(0, 1, SAMPLES), a, b, rng)
+    length = np.sum(np.linalg.norm(np.diff(points, axis=0), axis=1))
+    if length > max_length:
+        points *= max_length / length
+    return resample(points, step).astype(np.float32)
@@ -1,6 +1,8 @@
 import logging
 import sys
-from typing import NamedTuple
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -16,38 +18,105 @@ class Point(NamedTuple):
     y: float
 
 
-class Joint(NamedTuple):
-    x: float
-    y: float
-    score: float
+class Poses:
+    """
+    Joints of people as a (people, joints, 3) float32 array of x and y relative to the frame size and score.
 
+    Unknown joints are NaN, valid is the mask of the known ones. Indexing with a slice or an index
+    array selects people.
+    """
 
-def get_int_middle_point(point1, point2):
-    p1x, p1y = point1
-    p2x, p2y = point2
-    p3x = (p1x + p2x) // 2
-    p3y = (p1y + p2y) // 2
-    return p3x, p3y
+    __slots__ = ('data', 'valid')
+
+    def __init__(self, data):
+        self.data = np.asarray(data, np.float32)
+        if self.data.ndim != 3 or self.data.shape[2] != 3:
+            raise ValueError(f'Poses need a (people, joints, 3) array, got {self.data.shape}')
+        self.valid = ~np.isnan(self.data).any(axis=2)
+
+    @classmethod
+    def empty(cls, num_joints=0):
+        return cls(np.zeros((0, num_joints, 3), np.float32))
+
+    @classmethod
+    def from_pixels(cls, joints, shape):
+        """Poses of (people, joints, 3) pixel x, y and score in a frame of the given shape"""
+        data = np.array(joints, np.float32)
+        data[..., :2] /= (shape[1], shape[0])
+        np.clip(data[..., :2], 0, 1, out=data[..., :2])
+        return cls(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, people):
+        return Poses(self.data[people])
 
+    @property
+    def xy(self):
+        return self.data[..., :2]
 
-def flip_joints(joints):
-    if joints is None:
-        return None
-    ret = []
-    for joint in joints:
-        ret.append(Joint(1-joint.x, joint.y, joint.score))
-    return ret
+    @property
+    def scores(self):
+        return self.data[..., 2]
 
+    def to_pixels(self, shape):
+        """(people, joints, 2) integer pixel coordinates in a frame of the given shape, unknown joints are 0"""
+        return (np.nan_to_num(self.xy) * (shape[1], shape[0])).astype(np.int32)
 
-def normalize(coordinate: int, length: int) -> float:
-    """Convert a pixel coordinate to normalized float coordinate between 0 and 1"""
-    if not (0 <= coordinate <= length):
-        raise ValueError('Coordinate exceeds bounds')
-    return coordinate / length
+    def visible(self, threshold):
+        """Mask of the known joints inside the frame with a score of at least threshold"""
+        with np.errstate(invalid='ignore'):
+            inside = ((self.xy >= 0) & (self.xy <= 1)).all(axis=2)
+            return self.valid & inside & (self.scores >= threshold)
 
+    def flip(self):
+        """Poses mirrored horizontally"""
+        data = self.data.copy()
+        data[..., 0] = 1 - data[..., 0]
+        return Poses(data)
 
-def denormalize(coordinate: float, length: int) -> int:
-    """Convert a normalized float coordinate between 0 and 1 to a pixel coordinate"""
-    if not (0 <= coordinate <= 1):
-        raise ValueError('Coordinate exceeds bounds')
-    return int(coordinate * length)
+    def decay(self, factor):
+        """Poses with scores multiplied by factor"""
+        data = self.data.copy()
+        data[..., 2] *= factor
+        return Poses(data)
+
+    def split(self):
+        """
+        Poses of the people in the left and the right half of the frame, relative to their half.
+
+        People belong to the half most of their joints are in, their joints in the other half become unknown.
+        """
+        x = self.data[..., 0]
+        with np.errstate(invalid='ignore'):
+            left = (x <= 0.5).sum(axis=1) > (x > 0.5).sum(axis=1)
+            left_data = self.data[left]
+            left_data[left_data[..., 0] >= 0.5] = np.nan
+            left_data[..., 0] *= 2
+            right_data = self.data[~left]
+            right_data[right_data[..., 0] <= 0.5] = np.nan
+            right_data[..., 0] = (right_data[..., 0] - 0.5) * 2
+        return Poses(left_data), Poses(right_data)
+
+
+class FrameInfo(NamedTuple):
+    seq: int
+    # time.perf_counter() right after the frame was captured
+    timestamp: float
+    shape: Tuple[int, int, int]
+
+
+class PoseResult(NamedTuple):
+    frame: FrameInfo
+    joints: Poses
+    # Stable identities of the people in joints
+    track_ids: List[int]
+
+
+def get_int_middle_point(point1, point2):
+    p1x, p1y = point1
+    p2x, p2y = point2
+    p3x = (p1x + p2x) // 2
+    p3y = (p1y + p2y) // 2
+    return p3x, p3y
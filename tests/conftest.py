@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules of the game are imported the way src/main.py sees them
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
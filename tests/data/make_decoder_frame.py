@@ -0,0 +1,28 @@
+"""
+Writes decoder_frame.npz, run from the project root: `python tests/data/make_decoder_frame.py`
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'src'))
+from benchmark import synthetic_decoder_inputs  # noqa: E402
+
+rng = np.random.default_rng(7)
+height, width = 32, 48
+heatmaps, _, tags = synthetic_decoder_inputs(rng, 4, height=height, width=width)
+# Some joints of the people are not detected, so that refine has joints to look for
+heatmaps[0, rng.integers(0, 17, 12), :, :] *= np.where(rng.uniform(size=(12, 1, 1)) < 0.5, 0.05, 1)
+# A person seen only by its nose, strongest of all nose detections, falls below the pose threshold
+heatmaps[0, 0, 2, 3] = 1.0
+tags[0, 0, 2, 3, 0] = 20.0
+# Values rounded to half precision keep the fixture small
+heatmaps = heatmaps.astype(np.float16).astype(np.float32)
+tags = tags.astype(np.float16).astype(np.float32)
+# Only local maxima are left in the heatmaps after non-maximum suppression, like in the network outputs
+padded = np.pad(heatmaps, ((0, 0), (0, 0), (1, 1), (1, 1)))
+windows = np.lib.stride_tricks.sliding_window_view(padded, (3, 3), axis=(2, 3)).max(axis=(-2, -1))
+nms_heatmaps = np.where(heatmaps == windows, heatmaps, 0).astype(np.float32)
+np.savez_compressed(Path(__file__).parent / 'decoder_frame.npz',
+                    heatmaps=heatmaps, nms_heatmaps=nms_heatmaps, embeddings=tags)
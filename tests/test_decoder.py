@@ -0,0 +1,100 @@
+"""
+Associative embedding decoder against its loop based implementation, step by step and end to end
+against the baseline decoder of baseline_decoder.py.
+
+data/decoder_frame.npz holds decoder inputs in the format of `benchmark.py decoder --record`:
+four synthetic people from benchmark.synthetic_decoder_inputs, joint types left undetected for
+refine to look for, and a person seen only by its nose that falls below the pose threshold.
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from baseline_decoder import AssociativeEmbeddingDecoder as BaselineDecoder
+from benchmark import check_decoder, synthetic_decoder_inputs
+from pose_utils.models.hpe_associative_embedding import AssociativeEmbeddingDecoder
+
+FRAME_PATH = Path(__file__).parent / 'data' / 'decoder_frame.npz'
+DECODER_PARAMS = dict(
+    num_joints=17, adjust=True, refine=True, max_num_people=30, detection_threshold=0.1, tag_threshold=1,
+    pose_threshold=0.1, use_detection_val=True, ignore_too_much=False, dist_reweight=True)
+
+
+@pytest.fixture
+def frame():
+    record = np.load(FRAME_PATH)
+    return record['heatmaps'], record['nms_heatmaps'], record['embeddings']
+
+
+def test_steps_match_loops_on_recorded_frame(frame):
+    check_decoder(AssociativeEmbeddingDecoder(**DECODER_PARAMS), [frame], np.random.default_rng(0))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_steps_match_loops_on_synthetic_frames(seed):
+    rng = np.random.default_rng(seed)
+    inputs = [synthetic_decoder_inputs(rng, num_people) for num_people in (1, 10, 30)]
+    check_decoder(AssociativeEmbeddingDecoder(**DECODER_PARAMS), inputs, rng)
+
+
+class FixedBaselineDecoder(BaselineDecoder):
+    """
+    Baseline decoder giving refine the tags of the poses kept by the pose threshold.
+
+    The baseline indexed the tags of all poses with the index of the kept pose, so that a pose
+    looked for its missing joints by the tag of another pose once a pose before it was dropped.
+    """
+
+    def __call__(self, heatmaps, tags, nms_heatmaps):
+        tag_k, loc_k, val_k = self.top_k(nms_heatmaps, tags)
+        ans, ans_tags = map(list, zip(*map(self._match_by_tag, zip(tag_k, loc_k, val_k))))
+        np.abs(heatmaps, out=heatmaps)
+        if self.do_adjust:
+            ans = self.adjust(ans, heatmaps)
+
+        ans = ans[0]
+        scores = np.asarray([i[:, 2].mean() for i in ans])
+        mask = scores > self.pose_threshold
+        ans = ans[mask]
+        scores = scores[mask]
+
+        if self.do_refine:
+            for i, (pose, pose_tag) in enumerate(zip(ans, ans_tags[0][mask])):
+                ans[i] = self.refine(heatmaps[0], tags[0], pose, pose_tag)
+        return ans, scores
+
+
+def decode(decoder, frame):
+    heatmaps, nms_heatmaps, embeddings = frame
+    return decoder(heatmaps.copy(), embeddings, nms_heatmaps=nms_heatmaps)
+
+
+def test_decoder_matches_baseline_on_recorded_frame(frame):
+    poses, scores = decode(AssociativeEmbeddingDecoder(**DECODER_PARAMS), frame)
+    baseline_poses, baseline_scores = decode(FixedBaselineDecoder(**DECODER_PARAMS), frame)
+
+    assert len(poses) > 0
+    np.testing.assert_array_equal(poses, baseline_poses)
+    np.testing.assert_array_equal(scores, baseline_scores)
+
+
+def test_baseline_refined_poses_with_tags_of_other_poses(frame):
+    # The nose only person of the recorded frame comes first and is dropped by the pose threshold
+    poses, scores = decode(AssociativeEmbeddingDecoder(**DECODER_PARAMS), frame)
+    baseline_poses, baseline_scores = decode(BaselineDecoder(**DECODER_PARAMS), frame)
+
+    np.testing.assert_array_equal(scores, baseline_scores)
+    assert not np.array_equal(poses, baseline_poses)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_decoder_matches_baseline_on_synthetic_frames(seed):
+    rng = np.random.default_rng(seed)
+    for num_people in (1, 10, 30):
+        frame = synthetic_decoder_inputs(rng, num_people)
+        poses, scores = decode(AssociativeEmbeddingDecoder(**DECODER_PARAMS), frame)
+        baseline_poses, baseline_scores = decode(FixedBaselineDecoder(**DECODER_PARAMS), frame)
+
+        np.testing.assert_array_equal(poses, baseline_poses)
+        np.testing.assert_array_equal(scores, baseline_scores)